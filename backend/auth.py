@@ -3,15 +3,21 @@ Authentication and session management for multi-user support
 """
 from fastapi import Depends, HTTPException, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlmodel import Session, select
-from typing import Optional
+from typing import Dict, Optional
+import asyncio
+import hashlib
 import jwt
+import time
 import os
 import secrets
 import logging
 from datetime import datetime, timedelta
-from backend.database import get_session
+from backend.database import get_session, async_session_maker
 from backend.models import User
+from backend.cache import TTLCache
 
 # JWT configuration
 _secret_key = os.getenv("JWT_SECRET_KEY")
@@ -26,6 +32,95 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
 security = HTTPBearer(auto_error=False)
 
+PERSONAL_EMAIL = "comadden@gmail.com"
+
+# Authenticated-principal cache: verified token -> user id, and user id / personal-mode
+# email -> detached User snapshot. Lets hot polling endpoints skip JWT verification and
+# the user lookup. Invalidate with invalidate_principal() on logout or profile changes.
+PRINCIPAL_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+principals = TTLCache(
+    max_entries=int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "256")),
+    ttls={"token": PRINCIPAL_TTL_SECONDS, "user": PRINCIPAL_TTL_SECONDS, "email": PRINCIPAL_TTL_SECONDS},
+)
+
+def _token_key(token: str) -> str:
+    # Don't keep raw bearer tokens around as dict keys
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _snapshot(user: User) -> User:
+    """Detached copy of a User, safe to share between requests and sessions."""
+    return User(**user.model_dump())
+
+def invalidate_principal(user_id: Optional[int] = None, token: Optional[str] = None):
+    """Forget cached principals for a token and/or user (logout, profile change)."""
+    if token:
+        principals.invalidate("token", _token_key(token))
+    if user_id is not None:
+        principals.invalidate("user", user_id)
+        principals.invalidate("email")
+
+# last_login write-behind: authenticated requests only record "seen at" in memory;
+# a background task writes the batch every LAST_LOGIN_FLUSH_SECONDS (and on shutdown).
+# Timestamps closer than LAST_LOGIN_GRANULARITY_SECONDS to the last recorded one are skipped.
+LAST_LOGIN_FLUSH_SECONDS = float(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "30"))
+LAST_LOGIN_GRANULARITY_SECONDS = float(os.getenv("LAST_LOGIN_GRANULARITY_SECONDS", "60"))
+
+_pending_logins: Dict[int, datetime] = {}  # user_id -> latest unflushed timestamp
+_recorded_logins: Dict[int, datetime] = {}  # user_id -> last timestamp we accepted
+_login_writer: Optional[asyncio.Task] = None
+
+def record_last_login(user: User, seen_at: Optional[datetime] = None):
+    """Buffer a last_login update for user (no DB write here)."""
+    seen_at = seen_at or datetime.utcnow()
+    previous = _recorded_logins.get(user.id) or user.last_login
+    if not previous or (seen_at - previous).total_seconds() >= LAST_LOGIN_GRANULARITY_SECONDS:
+        _recorded_logins[user.id] = previous = seen_at
+        _pending_logins[user.id] = seen_at
+    # Show the buffered value on the loaded object without marking it dirty
+    # (so it doesn't turn into an UPDATE if the request commits something else)
+    if user.last_login is None or previous > user.last_login:
+        set_committed_value(user, "last_login", previous)
+
+async def flush_last_logins():
+    """Write all buffered last_login timestamps in one transaction."""
+    if not _pending_logins:
+        return
+    batch = dict(_pending_logins)
+    _pending_logins.clear()
+    try:
+        async with async_session_maker() as session:
+            for user_id, seen_at in batch.items():
+                await session.execute(update(User).where(User.id == user_id).values(last_login=seen_at))
+            await session.commit()
+    except Exception as e:
+        print(f"Failed to flush last_login updates: {e}")
+        # Put them back unless a newer timestamp arrived meanwhile
+        for user_id, seen_at in batch.items():
+            _pending_logins.setdefault(user_id, seen_at)
+
+async def _last_login_writer():
+    while True:
+        await asyncio.sleep(LAST_LOGIN_FLUSH_SECONDS)
+        await flush_last_logins()
+
+def start_last_login_writer():
+    """Start the periodic flush task (called from main.lifespan)."""
+    global _login_writer
+    if _login_writer is None or _login_writer.done():
+        _login_writer = asyncio.create_task(_last_login_writer())
+
+async def stop_last_login_writer():
+    """Stop the flush task and write whatever is still buffered (called on shutdown)."""
+    global _login_writer
+    if _login_writer is not None:
+        _login_writer.cancel()
+        try:
+            await _login_writer
+        except asyncio.CancelledError:
+            pass
+        _login_writer = None
+    await flush_last_logins()
+
 def create_access_token(user_id: int, email: str) -> str:
     """Create a JWT access token for a user"""
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -46,7 +141,7 @@ def decode_access_token(token: str) -> dict:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired"
         )
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
@@ -74,22 +169,29 @@ async def get_current_user(
     if not token:
         return None
     
-    # Decode and validate token
-    payload = decode_access_token(token)
-    user_id = int(payload.get("sub"))
+    # Decode and validate token (verified tokens are cached until they expire)
+    token_key = _token_key(token)
+    hit, user_id = principals.get("token", token_key)
+    if not hit:
+        payload = decode_access_token(token)
+        user_id = int(payload.get("sub"))
+        expires_in = payload.get("exp", 0) - time.time()
+        principals.set("token", token_key, user_id, ttl=min(PRINCIPAL_TTL_SECONDS, max(expires_in, 0)))
     
-    # Get user from database
-    user = await session.get(User, user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+    # Get user snapshot, from the DB on a miss
+    hit, user = principals.get("user", user_id)
+    if not hit:
+        db_user = await session.get(User, user_id)
+        if not db_user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        user = _snapshot(db_user)
+        principals.set("user", user_id, user)
     
-    # Update last login
-    user.last_login = datetime.utcnow()
-    session.add(user)
-    await session.commit()
+    # Update last login (buffered, written in batches by the last_login writer)
+    record_last_login(user)
     
     return user
 
@@ -104,14 +206,19 @@ async def require_user(user: Optional[User] = Depends(get_current_user), session
     # Personal mode: get or create a default user
     import os
     if os.getenv("PERSONAL_MODE", "true").lower() == "true":
+        hit, default_user = principals.get("email", PERSONAL_EMAIL)
+        if hit:
+            return default_user
         from sqlmodel import select as sql_select
-        result = await session.execute(sql_select(User).where(User.email == "comadden@gmail.com"))
+        result = await session.execute(sql_select(User).where(User.email == PERSONAL_EMAIL))
         default_user = result.scalar_one_or_none()
         if not default_user:
-            default_user = User(email="comadden@gmail.com", name="Cormac Madden")
+            default_user = User(email=PERSONAL_EMAIL, name="Cormac Madden")
             session.add(default_user)
             await session.commit()
             await session.refresh(default_user)
+        default_user = _snapshot(default_user)
+        principals.set("email", PERSONAL_EMAIL, default_user)
         return default_user
 
     raise HTTPException(
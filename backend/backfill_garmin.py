@@ -0,0 +1,264 @@
+"""
+Script to backfill Garmin history into the local store (backend/garmin_sync.py).
+Run it once on a new deployment; the app then only keeps recent days current.
+
+    python -m backend.backfill_garmin --years 3
+    python -m backend.backfill_garmin --start 2022-01-01 --kinds stats,sleep --rate 0.5
+
+Days are fetched newest first in batches of --batch-days, skipping days already
+stored. Requests are spaced to --rate per second and 429s back off. A checkpoint
+is written to backend/.garmin_backfill.json (gitignored) after every batch;
+rerunning resumes from it (--restart starts over). Needs a saved session: run authenticate_garmin.py first.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+from garminconnect import Garmin, GarminConnectTooManyRequestsError
+from sqlmodel import SQLModel
+
+from backend import garmin_sync
+from backend.database import engine
+from backend.executors import run_blocking, shutdown_pools
+from backend.metrics import status_from_exception
+from backend.models import GarminActivity, GarminActivityTrack, GarminBodyComposition, GarminDailyStats, GarminSleep  # Tables for create_all
+
+# Load environment variables
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+ENV_PATH = os.path.join(CURRENT_DIR, '.env')
+load_dotenv(ENV_PATH)
+
+TOKEN_DIR = os.path.join(CURRENT_DIR, ".garmin_tokens")
+CHECKPOINT_PATH = os.path.join(CURRENT_DIR, ".garmin_backfill.json")
+
+DEFAULT_RATE = float(os.getenv("GARMIN_BACKFILL_RATE", "1"))  # Requests per second
+DAILY_KINDS = (garmin_sync.STATS, garmin_sync.SLEEP, garmin_sync.BODY)
+ALL_KINDS = DAILY_KINDS + (garmin_sync.ACTIVITIES,)
+ACTIVITY_PAGE_SIZE = 50
+MAX_RETRIES = 5
+
+def login() -> Garmin:
+    """Log in from the session saved by authenticate_garmin.py."""
+    client = Garmin()
+    client.login(TOKEN_DIR)
+    return client
+
+def rate_limited(client: Garmin, rate: float, checkpoint: dict):
+    """A garmin_sync `call` that starts at most `rate` requests per second, retries 429s and counts requests."""
+    interval = 1 / rate
+    lock = asyncio.Lock()
+    next_start = time.monotonic()
+
+    async def call(method: str, *args):
+        nonlocal next_start
+        for attempt in range(1, MAX_RETRIES + 1):
+            async with lock:
+                wait = next_start - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                next_start = max(next_start, time.monotonic()) + interval
+            checkpoint["requests"] += 1
+            try:
+                return await run_blocking("garmin", getattr(client, method), *args)
+            except Exception as e:
+                if not isinstance(e, GarminConnectTooManyRequestsError) and status_from_exception(e) != 429:
+                    raise
+                if attempt == MAX_RETRIES:
+                    raise
+                backoff = 60 * 2 ** (attempt - 1)
+                print(f"  Rate limited by Garmin - waiting {backoff}s (attempt {attempt}/{MAX_RETRIES})")
+                async with lock:
+                    await asyncio.sleep(backoff)
+                    next_start = time.monotonic()
+
+    return call
+
+def load_checkpoint() -> dict:
+    if not os.path.exists(CHECKPOINT_PATH):
+        return {}
+    with open(CHECKPOINT_PATH) as f:
+        return json.load(f)
+
+def save_checkpoint(checkpoint: dict):
+    """Write the checkpoint atomically so an interrupt never leaves half a file."""
+    checkpoint["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+def new_checkpoint(args) -> dict:
+    end = date.today()
+    start = date.fromisoformat(args.start) if args.start else end - timedelta(days=round(args.years * 365))
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "kinds": args.kinds,
+        "tracks": args.tracks,
+        "next_day": end.isoformat(),  # Newest day not yet backfilled
+        "activities_offset": 0,
+        "activities_done": garmin_sync.ACTIVITIES not in args.kinds,
+        "requests": 0,
+        "days_stored": 0,
+        "days_failed": 0,
+        "activities_stored": 0,
+        "elapsed_seconds": 0.0,
+    }
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+async def backfill_days(call, checkpoint: dict, batch_days: int, save):
+    """Fetch missing days for every daily kind, newest batch first, checkpointing after each batch."""
+    start = date.fromisoformat(checkpoint["start"])
+    kinds = [kind for kind in checkpoint["kinds"] if kind in DAILY_KINDS]
+    total_days = (date.fromisoformat(checkpoint["end"]) - start).days + 1
+
+    while kinds and date.fromisoformat(checkpoint["next_day"]) >= start:
+        batch_end = date.fromisoformat(checkpoint["next_day"])
+        batch_start = max(start, batch_end - timedelta(days=batch_days - 1))
+        requests_before = checkpoint["requests"]
+        batch_started = time.monotonic()
+
+        stored = failed = 0
+        for kind in kinds:
+            missing = await garmin_sync.missing_days(kind, batch_start, batch_end)
+            kind_stored = await garmin_sync.sync_days(call, kind, missing)
+            stored += kind_stored
+            failed += len(missing) - kind_stored
+
+        if failed and not stored:
+            # Nothing came back at all (outage, expired session): keep the checkpoint at this batch
+            raise RuntimeError(f"every request for {batch_start} → {batch_end} failed")
+        checkpoint["next_day"] = (batch_start - timedelta(days=1)).isoformat()
+        checkpoint["days_stored"] += stored
+        checkpoint["days_failed"] += failed
+        save()
+
+        done_days = (date.fromisoformat(checkpoint["end"]) - batch_start).days + 1
+        batch_requests = checkpoint["requests"] - requests_before
+        batch_rate = batch_requests / max(time.monotonic() - batch_started, 1e-9)
+        remaining = (batch_start - start).days * len(kinds)
+        eta = f", ETA {format_duration(remaining / batch_rate)}" if batch_rate and remaining else ""
+        print(f"{'✓' if not failed else '✗'} {batch_start} → {batch_end}: {stored} day rows"
+              f"{f' ({failed} failed)' if failed else ''}, {batch_requests} requests "
+              f"({batch_rate:.2f} req/s, {done_days * 100 // total_days}% done{eta})")
+
+async def backfill_activities(call, checkpoint: dict, save):
+    """Page through activities newest first until the backfill start date, checkpointing after each page."""
+    start = checkpoint["start"]
+    while not checkpoint["activities_done"]:
+        page = await call("get_activities", checkpoint["activities_offset"], ACTIVITY_PAGE_SIZE) or []
+        in_range = [a for a in page if (a.get("startTimeLocal") or "")[:10] >= start]
+        new = await garmin_sync.store_activities(in_range)
+
+        tracks = 0
+        if checkpoint["tracks"]:
+            ids = [a["activityId"] for a in in_range if a.get("activityId") is not None]
+            for activity_id in await garmin_sync.missing_tracks(ids):
+                await garmin_sync.sync_track(call, activity_id)
+                tracks += 1
+
+        checkpoint["activities_offset"] += len(page)
+        checkpoint["activities_stored"] += new
+        checkpoint["activities_done"] = len(page) < ACTIVITY_PAGE_SIZE or len(in_range) < len(page)
+        save()
+
+        oldest = (in_range[-1].get("startTimeLocal") or "?")[:10] if in_range else start
+        print(f"✓ Activities {checkpoint['activities_offset'] - len(page) + 1}-{checkpoint['activities_offset']}: "
+              f"{new} new, {tracks} tracks (back to {oldest})")
+
+async def backfill(args):
+    """Backfill Garmin history, resuming from the checkpoint if there is one."""
+    checkpoint = {} if args.restart else load_checkpoint()
+    if checkpoint and date.fromisoformat(checkpoint["next_day"]) < date.fromisoformat(checkpoint["start"]) \
+            and checkpoint["activities_done"]:
+        checkpoint = {}  # Last run finished; start a new one (stored days are skipped anyway)
+    if checkpoint:
+        print(f"Resuming backfill from checkpoint ({checkpoint['start']} → {checkpoint['next_day']} left, "
+              f"{checkpoint['requests']} requests so far). Use --restart to start over.")
+    else:
+        checkpoint = new_checkpoint(args)
+        print(f"Backfilling Garmin {', '.join(checkpoint['kinds'])} from {checkpoint['start']} to {checkpoint['end']}...")
+    print(f"Rate limit: {args.rate} requests/s, {args.batch_days} days per batch\n")
+
+    # Make sure the tables exist (same as /api/init-db)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    try:
+        client = await run_blocking("garmin", login)
+    except Exception as e:
+        print(f"✗ Failed to load saved Garmin session: {e}")
+        print("  Run: python backend/authenticate_garmin.py")
+        return False
+
+    call = rate_limited(client, args.rate, checkpoint)
+    requests_before = checkpoint["requests"]
+    elapsed_before = checkpoint["elapsed_seconds"]
+    run_started = time.monotonic()
+
+    def save():
+        checkpoint["elapsed_seconds"] = elapsed_before + time.monotonic() - run_started
+        save_checkpoint(checkpoint)
+
+    try:
+        await backfill_days(call, checkpoint, args.batch_days, save)
+        await backfill_activities(call, checkpoint, save)
+    except Exception as e:
+        print(f"\n✗ Backfill failed: {e}")
+        print("  Progress up to the last batch is saved; rerun to resume.")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        # garth may have refreshed the session during a long run
+        try:
+            client.garth.dump(TOKEN_DIR)
+        except Exception as e:
+            print(f"Failed to save Garmin session: {e}")
+
+    run_seconds = time.monotonic() - run_started
+    print(f"\n✓ Backfill complete in {format_duration(run_seconds)}")
+    run_requests = checkpoint["requests"] - requests_before
+    print(f"  Requests this run: {run_requests} ({run_requests / max(run_seconds, 1e-9):.2f} req/s)")
+    print(f"  Day rows stored: {checkpoint['days_stored']}, activities stored: {checkpoint['activities_stored']}")
+    print(f"  Total: {checkpoint['requests']} requests in {format_duration(checkpoint['elapsed_seconds'])}")
+    if checkpoint["days_failed"]:
+        print(f"✗ {checkpoint['days_failed']} day fetches failed; run again with --restart to retry just the missing days")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill Garmin history into the local store")
+    parser.add_argument("--years", type=float, default=3, help="How far back to go (default 3 years)")
+    parser.add_argument("--start", help="Backfill from this date (YYYY-MM-DD) instead of --years")
+    parser.add_argument("--kinds", default="stats,sleep,activities",
+                        help=f"Comma-separated subset of {','.join(ALL_KINDS)} (default stats,sleep,activities)")
+    parser.add_argument("--tracks", action="store_true", help="Also fetch GPS tracks of backfilled activities")
+    parser.add_argument("--batch-days", type=int, default=30, help="Days per batch/checkpoint (default 30)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Max requests per second (default 1)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    args.kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in args.kinds if kind not in ALL_KINDS]
+    if unknown or args.rate <= 0 or args.batch_days < 1:
+        parser.error(f"invalid options (unknown kinds: {unknown})" if unknown else "--rate and --batch-days must be positive")
+
+    try:
+        ok = asyncio.run(backfill(args))
+    except KeyboardInterrupt:
+        print("\n✗ Interrupted - progress up to the last batch is saved; rerun to resume.")
+        ok = False
+    finally:
+        shutdown_pools()
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+In-memory TTL/LRU cache shared by all routers.
+
+Entries live in one size-bounded LRU, grouped into namespaces that each have
+their own TTL. Hit/miss/eviction counters are kept per namespace so cache
+behaviour can be inspected at runtime.
+
+Namespaces can also have a stale window (stale-while-revalidate): once an
+entry's TTL lapses it is still served for up to the stale window while a
+background task refreshes it. Past that hard expiry the caller waits again.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from backend.singleflight import group
+
+# Default TTLs (seconds) per namespace
+NAMESPACE_TTLS: Dict[str, float] = {
+    "garmin": 10 * 60,
+    "transport": 60,
+}
+DEFAULT_TTL = 60
+
+# Extra seconds past the TTL during which stale values are served while refreshing
+NAMESPACE_STALE_TTLS: Dict[str, float] = {
+    "garmin": 60 * 60,
+    "transport": 5 * 60,
+}
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+# Argument types that are safe to use in a cache key (dependencies like
+# clients, sessions and users are skipped)
+_KEY_TYPES = (str, int, float, bool, type(None), date, datetime)
+
+
+COUNTERS = ("hits", "stale_hits", "misses", "evictions", "expirations", "refreshes", "refresh_errors")
+
+
+class TTLCache:
+    """Size-bounded LRU cache with per-namespace TTLs and counters."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttls: Optional[Dict[str, float]] = None,
+                 stale_ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self.stale_ttls = dict(stale_ttls or {})
+        # (namespace, key) -> (value, fresh_until, stale_until)
+        self._data: "OrderedDict[Tuple[str, Hashable], Tuple[Any, float, float]]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, counter: str):
+        stats = self._stats.setdefault(namespace, dict.fromkeys(COUNTERS, 0))
+        stats[counter] += 1
+
+    def ttl_for(self, namespace: str) -> float:
+        return self.ttls.get(namespace, DEFAULT_TTL)
+
+    def stale_ttl_for(self, namespace: str) -> float:
+        return self.stale_ttls.get(namespace, 0)
+
+    def lookup(self, namespace: str, key: Hashable, allow_stale: bool = True) -> Tuple[str, Any]:
+        """
+        Return (state, value) where state is "fresh", "stale" or "miss".
+        Entries past their hard expiry are dropped and count as a miss; with
+        allow_stale=False a stale entry is kept but also counts as a miss.
+        """
+        entry = self._data.get((namespace, key))
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            now = time.monotonic()
+            if now < stale_until:
+                self._data.move_to_end((namespace, key))
+                if now < fresh_until:
+                    self._count(namespace, "hits")
+                    return "fresh", value
+                if allow_stale:
+                    self._count(namespace, "stale_hits")
+                    return "stale", value
+                self._count(namespace, "misses")
+                return "miss", None
+            del self._data[(namespace, key)]
+            self._count(namespace, "expirations")
+        self._count(namespace, "misses")
+        return "miss", None
+
+    def get(self, namespace: str, key: Hashable) -> Tuple[bool, Any]:
+        """Return (hit, value) for fresh entries only."""
+        state, value = self.lookup(namespace, key, allow_stale=False)
+        return state == "fresh", value
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float] = None,
+            stale_ttl: Optional[float] = None):
+        """Store a value, evicting least-recently-used entries beyond max_entries."""
+        ttl = self.ttl_for(namespace) if ttl is None else ttl
+        stale_ttl = self.stale_ttl_for(namespace) if stale_ttl is None else stale_ttl
+        now = time.monotonic()
+        self._data[(namespace, key)] = (value, now + ttl, now + ttl + stale_ttl)
+        self._data.move_to_end((namespace, key))
+        while len(self._data) > self.max_entries:
+            (evicted_namespace, _), _ = self._data.popitem(last=False)
+            self._count(evicted_namespace, "evictions")
+
+    def invalidate(self, namespace: str, key: Optional[Hashable] = None):
+        """Drop one key, or the whole namespace when key is None."""
+        if key is not None:
+            self._data.pop((namespace, key), None)
+            return
+        for cache_key in [k for k in self._data if k[0] == namespace]:
+            del self._data[cache_key]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        sizes: Dict[str, int] = {}
+        for namespace, _ in self._data:
+            sizes[namespace] = sizes.get(namespace, 0) + 1
+        namespaces = {}
+        for namespace in set(self._stats) | set(sizes):
+            counters = self._stats.get(namespace, dict.fromkeys(COUNTERS, 0))
+            served = counters["hits"] + counters["stale_hits"]
+            lookups = served + counters["misses"]
+            namespaces[namespace] = {
+                **counters,
+                "size": sizes.get(namespace, 0),
+                "ttl_seconds": self.ttl_for(namespace),
+                "stale_ttl_seconds": self.stale_ttl_for(namespace),
+                "hit_rate": round(served / lookups, 3) if lookups else None,
+            }
+        return {"entries": len(self._data), "max_entries": self.max_entries, "namespaces": namespaces}
+
+
+cache = TTLCache(ttls=NAMESPACE_TTLS, stale_ttls=NAMESPACE_STALE_TTLS)
+
+# Background refresh tasks by key, kept referenced so they aren't garbage collected mid-flight
+_refresh_tasks: Dict[tuple, asyncio.Task] = {}
+
+
+def _schedule_refresh(namespace: str, key: tuple, call: Callable[[], Awaitable[Any]],
+                      ttl: Optional[float], stale_ttl: Optional[float]):
+    """Refresh a stale entry in the background (at most one refresh per key at a time)."""
+    flight_key = (namespace,) + key
+    if flight_key in _refresh_tasks:
+        return
+
+    async def refresh():
+        try:
+            value = await group.do(flight_key, call)
+            cache.set(namespace, key, value, ttl, stale_ttl)
+            cache._count(namespace, "refreshes")
+        except Exception as e:
+            cache._count(namespace, "refresh_errors")
+            print(f"Background refresh failed for {namespace} {key[0]}: {e}")
+
+    task = asyncio.create_task(refresh())
+    _refresh_tasks[flight_key] = task
+    task.add_done_callback(lambda _: _refresh_tasks.pop(flight_key, None))
+
+
+async def cancel_refreshes():
+    """Cancel pending background refreshes (called from main.lifespan on shutdown)."""
+    tasks = list(_refresh_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def make_key(func: Callable, args: tuple, kwargs: dict, exclude: Tuple[str, ...] = (), daily: bool = False) -> tuple:
+    """Build a cache key from the function name and its simple-typed arguments."""
+    bound = inspect.signature(func).bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+    parts = tuple(
+        (name, value) for name, value in bound.arguments.items()
+        if name not in exclude and isinstance(value, _KEY_TYPES)
+    )
+    if daily:
+        parts += (("date", date.today().isoformat()),)
+    return (func.__name__,) + parts
+
+
+def cached(namespace: str, ttl: Optional[float] = None, stale_ttl: Optional[float] = None,
+           bypass: Optional[str] = None, daily: bool = False):
+    """
+    Cache the result of an async endpoint.
+
+    namespace: cache namespace (selects the default TTL)
+    ttl: override the namespace TTL for this endpoint
+    stale_ttl: override the namespace stale window; stale values are returned
+        immediately and refreshed in the background. Only use this on endpoints
+        whose dependencies outlive the request (no per-request DB sessions).
+    bypass: name of a boolean argument (e.g. "force") that skips the lookup but still refreshes the cache
+    daily: include today's date in the key so values roll over at midnight
+
+    Concurrent misses for the same key are coalesced into a single call.
+    """
+    def decorator(func):
+        exclude = (bypass,) if bypass else ()
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_key(func, args, kwargs, exclude=exclude, daily=daily)
+            skip = bool(bypass and inspect.signature(func).bind_partial(*args, **kwargs).arguments.get(bypass))
+            call = lambda: func(*args, **kwargs)
+            if not skip:
+                state, value = cache.lookup(namespace, key)
+                if state == "stale":
+                    _schedule_refresh(namespace, key, call, ttl, stale_ttl)
+                if state != "miss":
+                    return value
+            value = await group.do((namespace,) + key, call)
+            cache.set(namespace, key, value, ttl, stale_ttl)
+            return value
+
+        return wrapper
+    return decorator
@@ -0,0 +1,60 @@
+"""
+Bounded thread pools for blocking SDK calls (googleapiclient, garminconnect).
+
+The event loop must never wait on a synchronous HTTP call, but asyncio's
+default executor is shared by everything; a slow upstream could use all of
+it. Each provider gets its own named pool instead:
+
+    result = await run_blocking("google", request.execute)
+
+Pool sizes come from <NAME>_WORKERS env vars (e.g. GOOGLE_WORKERS=8).
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, TypeVar
+
+from backend.metrics import Gauge, registry
+
+T = TypeVar("T")
+
+DEFAULT_WORKERS = 4
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+
+pool_busy = registry.register(Gauge(
+    "lifeos_threadpool_busy", "Blocking calls running or queued per thread pool", ("pool",)))
+
+
+def get_pool(name: str, max_workers: int = DEFAULT_WORKERS) -> ThreadPoolExecutor:
+    pool = _pools.get(name)
+    if pool is None:
+        workers = int(os.getenv(f"{name.upper()}_WORKERS", str(max_workers)))
+        pool = _pools[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-sdk")
+    return pool
+
+
+async def run_blocking(pool: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run fn(*args, **kwargs) in the named pool (context vars are carried over, like asyncio.to_thread)."""
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    pool_busy.inc((pool,))
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_pool(pool), call)
+    finally:
+        pool_busy.dec((pool,))
+
+
+def pool_stats() -> List[dict]:
+    return [
+        {"pool": name, "max_workers": pool._max_workers, "busy": pool_busy.values.get((name,), 0)}
+        for name, pool in _pools.items()
+    ]
+
+
+def shutdown_pools():
+    """Stop all pools (called from main.lifespan on shutdown); queued calls are cancelled."""
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
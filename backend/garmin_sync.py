@@ -0,0 +1,443 @@
+"""
+Incremental Garmin sync into local time-series tables, so range views read from SQLite.
+
+Daily stats, sleep and body composition are stored one row per day. A day's data
+only changes while the day is open (today, and yesterday while the watch catches
+up), so a row is final once it was fetched on or after day + 2. ensure_days()
+fetches the newest GARMIN_SYNC_INLINE_DAYS missing days inline, the older ones in
+the background, and refreshes rows that may still change in the background once
+they are older than GARMIN_SYNC_INTERVAL_SECONDS; once stored, a 365-day view
+costs one upstream call per open day, like a 7-day one. Days that fail are not
+retried until a backoff (doubling from GARMIN_SYNC_RETRY_SECONDS) has passed.
+
+Activities are synced newest-first with get_activities pages until a page holds
+nothing new. Once a sync has reached the oldest activity, asking for more than
+are stored no longer syncs inline. Their GPS tracks are fetched once with get_activity_details and
+stored as encoded polylines at every detail level (backend/tracks.py); listing
+activities queues the missing tracks in the background.
+
+Upstream calls go through a `call(method, *args)` coroutine supplied by the caller
+(the router's shared client, or the backfill CLI's rate-limited one).
+"""
+import asyncio
+import datetime
+import json
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from backend.database import async_session_maker
+from backend.models import GarminActivity, GarminActivityTrack, GarminBodyComposition, GarminDailyStats, GarminSleep
+from backend.singleflight import group
+from backend.tracks import track_levels
+
+GARMIN_SYNC_INTERVAL_SECONDS = float(os.getenv("GARMIN_SYNC_INTERVAL_SECONDS", "600"))
+GARMIN_DAY_CONCURRENCY = int(os.getenv("GARMIN_DAY_CONCURRENCY", "4"))
+GARMIN_SYNC_INLINE_DAYS = int(os.getenv("GARMIN_SYNC_INLINE_DAYS", "7"))
+GARMIN_SYNC_RETRY_SECONDS = float(os.getenv("GARMIN_SYNC_RETRY_SECONDS", "300"))
+GARMIN_SYNC_MAX_RETRY_SECONDS = 24 * 60 * 60
+GARMIN_ACTIVITY_PAGE_SIZE = 20
+GARMIN_SYNC_MAX_ACTIVITIES = int(os.getenv("GARMIN_SYNC_MAX_ACTIVITIES", "1000"))
+GARMIN_TRACK_MAX_POINTS = int(os.getenv("GARMIN_TRACK_MAX_POINTS", "10000"))
+
+Call = Callable[..., Awaitable]
+
+STATS = "stats"
+SLEEP = "sleep"
+BODY = "body"
+ACTIVITIES = "activities"
+TRACKS = "tracks"
+
+_locks: Dict[str, asyncio.Lock] = {}
+_background: Dict[str, asyncio.Task] = {}
+_activities_synced_at: Optional[datetime.datetime] = None
+_activities_exhausted = False  # A sync reached the oldest activity
+_failures: Dict[Tuple[str, datetime.date], Tuple[int, datetime.datetime]] = {}  # (kind, day) -> (failures, retry at)
+
+
+def _lock(kind: str) -> asyncio.Lock:
+    lock = _locks.get(kind)
+    if lock is None:
+        lock = _locks[kind] = asyncio.Lock()
+    return lock
+
+
+def _schedule(kind: str, sync) -> None:
+    """Run sync() in the background unless one is already running for kind"""
+    task = _background.get(kind)
+    if task is not None and not task.done():
+        return
+
+    async def run():
+        try:
+            await sync()
+        except Exception as e:
+            print(f"Background Garmin {kind} sync failed: {e}")
+        finally:
+            _background.pop(kind, None)
+
+    _background[kind] = asyncio.create_task(run())
+
+
+async def cancel_syncs():
+    """Cancel background syncs (called from main.lifespan on shutdown)"""
+    tasks = list(_background.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _background.clear()
+
+
+async def fetch_days(call: Call, method: str, days: List[datetime.date]) -> list:
+    """Call method once per day concurrently (capped); failed days come back as None, in order."""
+    semaphore = asyncio.Semaphore(GARMIN_DAY_CONCURRENCY)
+
+    async def fetch(day: datetime.date):
+        async with semaphore:
+            try:
+                return await call(method, day.isoformat())
+            except Exception as e:
+                if getattr(e, "status_code", None) == 401:
+                    raise  # Not logged in; no point trying the other days
+                print(f"Garmin {method} failed for {day}: {e}")
+                return None
+
+    return await asyncio.gather(*(fetch(day) for day in days))
+
+
+# --- Per-day tables ---
+
+def _stats_fields(stats: dict) -> dict:
+    return {
+        "steps": stats.get("totalSteps"),
+        "calories": stats.get("totalKilocalories"),
+        "distance_meters": stats.get("totalDistanceMeters"),
+        "moderate_minutes": stats.get("moderateIntensityMinutes"),
+        "vigorous_minutes": stats.get("vigorousIntensityMinutes"),
+        "floors": stats.get("floorsAscended"),
+        "resting_hr": stats.get("restingHeartRate"),
+        "max_hr": stats.get("maxHeartRate"),
+        "min_hr": stats.get("minHeartRate"),
+        "avg_stress": stats.get("averageStressLevel"),
+        "max_stress": stats.get("maxStressLevel"),
+    }
+
+
+def _sleep_fields(sleep_data: dict) -> dict:
+    daily_sleep = sleep_data.get("dailySleepDTO") or {}
+    return {
+        "sleep_seconds": daily_sleep.get("sleepTimeSeconds") or 0,
+        "deep_seconds": daily_sleep.get("deepSleepSeconds"),
+        "light_seconds": daily_sleep.get("lightSleepSeconds"),
+        "rem_seconds": daily_sleep.get("remSleepSeconds"),
+        "awake_seconds": daily_sleep.get("awakeSleepSeconds"),
+        "score": ((daily_sleep.get("sleepScores") or {}).get("overall") or {}).get("value"),
+        "sleep_start": daily_sleep.get("sleepStartTimestampLocal"),
+        "sleep_end": daily_sleep.get("sleepEndTimestampLocal"),
+    }
+
+
+def _body_fields(body_comp: dict) -> dict:
+    weight = body_comp.get("weight")
+    if weight is None:
+        weight = (body_comp.get("totalAverage") or {}).get("weight")
+    return {"weight_grams": weight}
+
+
+# kind -> (table, SDK method, response -> row fields)
+DAILY = {
+    STATS: (GarminDailyStats, "get_stats", _stats_fields),
+    SLEEP: (GarminSleep, "get_sleep_data", _sleep_fields),
+    BODY: (GarminBodyComposition, "get_body_composition", _body_fields),
+}
+
+
+def _is_final(row) -> bool:
+    return row.fetched_at.date() >= row.day + datetime.timedelta(days=2)
+
+
+def _is_stale(row) -> bool:
+    return (datetime.datetime.now() - row.fetched_at).total_seconds() >= GARMIN_SYNC_INTERVAL_SECONDS
+
+
+def _record_failure(kind: str, day: datetime.date) -> None:
+    failures = _failures.get((kind, day), (0, None))[0] + 1
+    delay = min(GARMIN_SYNC_RETRY_SECONDS * 2 ** (failures - 1), GARMIN_SYNC_MAX_RETRY_SECONDS)
+    _failures[(kind, day)] = (failures, datetime.datetime.now() + datetime.timedelta(seconds=delay))
+
+
+def _backing_off(kind: str, day: datetime.date) -> bool:
+    failure = _failures.get((kind, day))
+    return failure is not None and datetime.datetime.now() < failure[1]
+
+
+def _date_range(start: datetime.date, end: datetime.date) -> List[datetime.date]:
+    return [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+async def _load_days(kind: str, start: datetime.date, end: datetime.date) -> Dict[datetime.date, object]:
+    model = DAILY[kind][0]
+    async with async_session_maker() as session:
+        result = await session.execute(select(model).where(model.day >= start, model.day <= end))
+        return {row.day: row for row in result.scalars().all()}
+
+
+async def missing_days(kind: str, start: datetime.date, end: datetime.date) -> List[datetime.date]:
+    """Days in [start, end] with no stored row"""
+    rows = await _load_days(kind, start, end)
+    return [day for day in _date_range(start, end) if day not in rows]
+
+
+async def sync_days(call: Call, kind: str, days: List[datetime.date]) -> int:
+    """Fetch the given days from Garmin and upsert them; returns how many were stored."""
+    if not days:
+        return 0
+    model, method, fields = DAILY[kind]
+    responses = await fetch_days(call, method, days)
+    fetched_at = datetime.datetime.now()
+    async with async_session_maker() as session:
+        result = await session.execute(select(model).where(model.day.in_(days)))
+        rows = {row.day: row for row in result.scalars().all()}
+        stored = 0
+        for day, response in zip(days, responses):
+            if response is None:
+                _record_failure(kind, day)  # Still missing; reads retry it once the backoff passes
+                continue
+            _failures.pop((kind, day), None)
+            row = rows.get(day) or model(day=day, fetched_at=fetched_at)
+            for name, value in fields(response).items():
+                setattr(row, name, value)
+            row.fetched_at = fetched_at
+            session.add(row)
+            stored += 1
+        await session.commit()
+    return stored
+
+
+async def _sync_missing(call: Call, kind: str, days: List[datetime.date]) -> None:
+    """Fetch whichever of days are still missing once kind's lock is held"""
+    async with _lock(kind):
+        rows = await _load_days(kind, min(days), max(days))
+        await sync_days(call, kind, [day for day in days if day not in rows])
+
+
+async def ensure_days(call: Call, kind: str, start: datetime.date, end: datetime.date) -> None:
+    """Make [start, end] available locally: the newest missing days inline, older missing
+    days and open stale days in the background"""
+    end = min(end, datetime.date.today())
+    rows = await _load_days(kind, start, end)
+    missing = [day for day in reversed(_date_range(start, end)) if day not in rows and not _backing_off(kind, day)]
+    inline, older = missing[:GARMIN_SYNC_INLINE_DAYS], missing[GARMIN_SYNC_INLINE_DAYS:]
+    if inline:
+        await _sync_missing(call, kind, inline)
+    if older:
+        async def backfill():
+            # One batch per lock hold, so inline fetches for other views aren't stuck behind the whole range
+            for i in range(0, len(older), GARMIN_SYNC_INLINE_DAYS):
+                await _sync_missing(call, kind, older[i:i + GARMIN_SYNC_INLINE_DAYS])
+
+        _schedule(f"{kind}:backfill", backfill)
+    open_days = [day for day, row in rows.items() if not _is_final(row) and _is_stale(row)]
+    if open_days:
+        async def refresh():
+            async with _lock(kind):
+                await sync_days(call, kind, sorted(open_days))
+
+        _schedule(kind, refresh)
+
+
+async def read_days(kind: str, start: datetime.date, end: datetime.date) -> list:
+    """Stored rows for [start, end], newest first"""
+    model = DAILY[kind][0]
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(model).where(model.day >= start, model.day <= end).order_by(model.day.desc())
+        )
+        return result.scalars().all()
+
+
+async def daily_rows(call: Call, kind: str, start: datetime.date, end: datetime.date) -> list:
+    await ensure_days(call, kind, start, end)
+    return await read_days(kind, start, end)
+
+
+async def sync_recent(call: Call, days: int) -> dict:
+    """Refetch the last `days` days of every per-day table plus the newest activities"""
+    today = datetime.date.today()
+    check_dates = _date_range(today - datetime.timedelta(days=days - 1), today)
+    stored = {}
+    for kind in DAILY:
+        async with _lock(kind):
+            stored[kind] = await sync_days(call, kind, check_dates)
+    async with _lock(ACTIVITIES):
+        stored[ACTIVITIES] = await sync_activities(call)
+    return stored
+
+
+# --- Activities ---
+
+def _activity_fields(activity: dict) -> dict:
+    return {
+        "name": activity.get("activityName"),
+        "type": (activity.get("activityType") or {}).get("typeKey"),
+        "start_time_local": activity.get("startTimeLocal") or "",
+        "duration_seconds": activity.get("duration"),
+        "distance_meters": activity.get("distance"),
+        "calories": activity.get("calories"),
+        "avg_hr": activity.get("averageHR"),
+        "max_hr": activity.get("maxHR"),
+    }
+
+
+async def store_activities(activities: List[dict]) -> int:
+    """Upsert a page of activities; returns how many weren't stored before."""
+    ids = [activity["activityId"] for activity in activities if activity.get("activityId") is not None]
+    fetched_at = datetime.datetime.now()
+    async with async_session_maker() as session:
+        result = await session.execute(select(GarminActivity).where(GarminActivity.activity_id.in_(ids)))
+        rows = {row.activity_id: row for row in result.scalars().all()}
+        new = 0
+        for activity in activities:
+            activity_id = activity.get("activityId")
+            if activity_id is None:
+                continue
+            row = rows.get(activity_id)
+            if row is None:
+                row = GarminActivity(activity_id=activity_id, fetched_at=fetched_at, start_time_local="")
+                new += 1
+            for name, value in _activity_fields(activity).items():
+                setattr(row, name, value)
+            row.fetched_at = fetched_at
+            session.add(row)
+        await session.commit()
+    return new
+
+
+async def _count_activities() -> int:
+    async with async_session_maker() as session:
+        result = await session.execute(select(func.count()).select_from(GarminActivity))
+        return result.scalar_one()
+
+
+async def sync_activities(call: Call, want: int = GARMIN_ACTIVITY_PAGE_SIZE) -> int:
+    """Page through get_activities newest-first until the pages reach activities already
+    stored (or there were none) and at least `want` are stored; returns how many were new."""
+    global _activities_synced_at, _activities_exhausted
+    total_new = 0
+    start = 0
+    stored = await _count_activities()
+    caught_up = stored == 0  # Nothing stored means no gap to close
+    while start < GARMIN_SYNC_MAX_ACTIVITIES:
+        page = await call("get_activities", start, GARMIN_ACTIVITY_PAGE_SIZE) or []
+        new = await store_activities(page)
+        total_new += new
+        stored += new
+        start += GARMIN_ACTIVITY_PAGE_SIZE
+        if len(page) < GARMIN_ACTIVITY_PAGE_SIZE:
+            _activities_exhausted = True  # Reached the oldest activity
+            break
+        caught_up = caught_up or new < len(page)
+        if caught_up and stored >= want:
+            break
+    else:
+        _activities_exhausted = True  # Hit GARMIN_SYNC_MAX_ACTIVITIES; more pages won't be fetched either
+    _activities_synced_at = datetime.datetime.now()
+    return total_new
+
+
+async def ensure_activities(call: Call, want: int) -> None:
+    """Sync inline when fewer than `want` activities are stored (and there may be more upstream),
+    otherwise in the background once stale"""
+    async with _lock(ACTIVITIES):
+        if not _activities_exhausted and await _count_activities() < want:
+            await sync_activities(call, want)
+            return
+    if (_activities_synced_at is None
+            or (datetime.datetime.now() - _activities_synced_at).total_seconds() >= GARMIN_SYNC_INTERVAL_SECONDS):
+        async def refresh():
+            async with _lock(ACTIVITIES):
+                await sync_activities(call, want)
+
+        _schedule(ACTIVITIES, refresh)
+
+
+async def recent_activities(call: Call, limit: int) -> List[GarminActivity]:
+    await ensure_activities(call, limit)
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(GarminActivity).order_by(GarminActivity.start_time_local.desc()).limit(limit)
+        )
+        activities = result.scalars().all()
+    await queue_tracks(call, [activity.activity_id for activity in activities])
+    return activities
+
+
+# --- GPS tracks ---
+
+def _track_coords(details: dict) -> List[List[float]]:
+    polyline = (details.get("geoPolylineDTO") or {}).get("polyline") or []
+    return [[p["lat"], p["lon"]] for p in polyline if p.get("lat") is not None and p.get("lon") is not None]
+
+
+async def sync_track(call: Call, activity_id: int) -> GarminActivityTrack:
+    """Fetch an activity's GPS track and store it (a 0-point row when it has none)."""
+    details = await call("get_activity_details", activity_id, 2000, GARMIN_TRACK_MAX_POINTS)
+    coords = _track_coords(details or {})
+    lats = [round(c[0], 5) for c in coords]
+    lons = [round(c[1], 5) for c in coords]
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(GarminActivityTrack).where(GarminActivityTrack.activity_id == activity_id)
+        )
+        track = result.scalars().first() or GarminActivityTrack(
+            activity_id=activity_id, fetched_at=datetime.datetime.now())
+        track.points = len(coords)
+        track.levels = json.dumps(track_levels(coords) if coords else {})
+        track.min_lat, track.max_lat = (min(lats), max(lats)) if coords else (None, None)
+        track.min_lon, track.max_lon = (min(lons), max(lons)) if coords else (None, None)
+        track.fetched_at = datetime.datetime.now()
+        session.add(track)
+        await session.commit()
+        await session.refresh(track)
+        return track
+
+
+async def get_track(call: Call, activity_id: int) -> GarminActivityTrack:
+    """Stored track, fetching it from Garmin the first time"""
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(GarminActivityTrack).where(GarminActivityTrack.activity_id == activity_id)
+        )
+        track = result.scalars().first()
+    if track is None:
+        track = await group.do(("garmin_track", activity_id), lambda: sync_track(call, activity_id))
+    return track
+
+
+async def missing_tracks(activity_ids: List[int]) -> List[int]:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(GarminActivityTrack.activity_id).where(GarminActivityTrack.activity_id.in_(activity_ids))
+        )
+        stored = set(result.scalars().all())
+    return [activity_id for activity_id in activity_ids if activity_id not in stored]
+
+
+async def queue_tracks(call: Call, activity_ids: List[int]) -> None:
+    """Fetch missing tracks for these activities in the background, one at a time"""
+    missing = await missing_tracks(activity_ids)
+    if not missing:
+        return
+
+    async def fetch():
+        for activity_id in missing:
+            try:
+                await sync_track(call, activity_id)
+            except Exception as e:
+                if getattr(e, "status_code", None) == 401:
+                    raise
+                print(f"Garmin track for activity {activity_id} failed: {e}")
+
+    _schedule(TRACKS, fetch)
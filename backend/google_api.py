@@ -0,0 +1,66 @@
+"""
+Shared googleapiclient plumbing for the Google router and the Gmail/Calendar sync.
+
+Service objects are built once per API from the discovery documents bundled with
+googleapiclient (no network, no per-request parsing) and shared by all users.
+Credentials are applied per call via an AuthorizedHttp around a per-thread httplib2
+connection (httplib2 isn't thread-safe; keeping one per pool thread keeps connections alive).
+All calls here are blocking; run them in the "google" pool (backend.executors).
+"""
+import threading
+from typing import Dict, Tuple
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import Resource, build
+
+from backend.metrics import track_upstream
+
+_services: Dict[Tuple[str, str], Resource] = {}
+_services_lock = threading.Lock()
+_thread_http = threading.local()
+
+
+def get_service(api: str, version: str) -> Resource:
+    service = _services.get((api, version))
+    if service is None:
+        with _services_lock:
+            service = _services.get((api, version))
+            if service is None:
+                service = build(api, version, http=httplib2.Http(), static_discovery=True)
+                _services[(api, version)] = service
+    return service
+
+
+def warm_services():
+    """Build the shared service objects up front (called from main.lifespan)"""
+    for api, version in (('gmail', 'v1'), ('calendar', 'v3'), ('oauth2', 'v2')):
+        get_service(api, version)
+
+
+def authorized_http(creds: Credentials) -> AuthorizedHttp:
+    http = getattr(_thread_http, "http", None)
+    if http is None:
+        http = _thread_http.http = httplib2.Http()
+    return AuthorizedHttp(creds, http=http)
+
+
+def execute(request, http=None):
+    """Execute a googleapiclient request, recording latency/status/bytes under its method id."""
+    with track_upstream("google", request.methodId or "unknown") as call:
+        postproc = request.postproc
+
+        def capture(resp, content):
+            call.status = resp.status
+            call.bytes_received = len(content or b"")
+            return postproc(resp, content)
+
+        request.postproc = capture
+        return request.execute(http=http)
+
+
+def execute_batch(batch, endpoint: str, http=None):
+    """Execute a BatchHttpRequest, recorded as one upstream call"""
+    with track_upstream("google", endpoint):
+        batch.execute(http=http)
@@ -0,0 +1,381 @@
+"""
+Incremental Google sync into local tables, so widgets read from SQLite.
+
+Calendar: events.list with the stored syncToken returns only what changed since
+the last sync; the first sync (or a 410 "token expired") lists everything from
+CALENDAR_SYNC_PAST_DAYS ago and replaces the local copy. Readers call
+ensure_calendar_synced(), which syncs inline only when there's no local state
+yet and otherwise refreshes in the background once the copy is older than
+CALENDAR_SYNC_INTERVAL_SECONDS.
+
+Gmail: the first sync stores headers (from, subject, date, labels) of messages
+from the last GMAIL_SYNC_DAYS into EmailMessage, fetched with metadata-only
+batch requests, and remembers the mailbox historyId. Later syncs replay
+users.history.list from that id (new and deleted messages, label changes); a
+404 (history id too old) falls back to a full sync. ensure_gmail_synced()
+follows the same inline/background rules as the calendar.
+"""
+import asyncio
+import datetime
+import os
+from typing import Dict, List, Optional, Tuple
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+from sqlalchemy import delete
+from sqlmodel import select
+
+from backend.database import async_session_maker
+from backend.executors import run_blocking
+from backend.google_api import authorized_http, execute, execute_batch, get_service
+from backend.models import CalendarEvent, EmailMessage, SyncState
+
+CALENDAR_SYNC_INTERVAL_SECONDS = float(os.getenv("CALENDAR_SYNC_INTERVAL_SECONDS", "60"))
+CALENDAR_SYNC_PAST_DAYS = int(os.getenv("CALENDAR_SYNC_PAST_DAYS", "30"))
+
+GMAIL_SYNC_INTERVAL_SECONDS = float(os.getenv("GMAIL_SYNC_INTERVAL_SECONDS", "60"))
+GMAIL_SYNC_DAYS = int(os.getenv("GMAIL_SYNC_DAYS", "30"))
+GMAIL_SYNC_MAX_MESSAGES = int(os.getenv("GMAIL_SYNC_MAX_MESSAGES", "500"))
+GMAIL_BATCH_SIZE = 50  # Gmail throttles larger batches
+
+CALENDAR = "google_calendar"
+GMAIL = "gmail"
+
+_locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+_background: Dict[Tuple[int, str], asyncio.Task] = {}
+
+
+def _lock(user_id: int, source: str) -> asyncio.Lock:
+    lock = _locks.get((user_id, source))
+    if lock is None:
+        lock = _locks[(user_id, source)] = asyncio.Lock()
+    return lock
+
+
+async def get_sync_state(user_id: int, source: str) -> Optional[SyncState]:
+    async with async_session_maker() as session:
+        result = await session.execute(select(SyncState).where(
+            SyncState.user_id == user_id,
+            SyncState.source == source
+        ))
+        return result.scalars().first()
+
+
+async def _save_sync_state(session, user_id: int, source: str, cursor: Optional[str], full: bool):
+    result = await session.execute(select(SyncState).where(
+        SyncState.user_id == user_id,
+        SyncState.source == source
+    ))
+    state = result.scalars().first() or SyncState(user_id=user_id, source=source)
+    now = datetime.datetime.utcnow()
+    state.cursor = cursor
+    state.last_synced_at = now
+    if full:
+        state.last_full_sync_at = now
+    session.add(state)
+
+
+def _is_stale(state: Optional[SyncState], interval: float) -> bool:
+    if state is None or state.last_synced_at is None:
+        return True
+    return (datetime.datetime.utcnow() - state.last_synced_at).total_seconds() >= interval
+
+
+def _schedule(user_id: int, source: str, sync) -> None:
+    """Run sync() in the background unless one is already running for (user, source)"""
+    key = (user_id, source)
+    task = _background.get(key)
+    if task is not None and not task.done():
+        return
+
+    async def run():
+        try:
+            await sync()
+        except Exception as e:
+            print(f"Background {source} sync failed for user {user_id}: {e}")
+        finally:
+            _background.pop(key, None)
+
+    _background[key] = asyncio.create_task(run())
+
+
+async def cancel_syncs():
+    """Cancel background syncs (called from main.lifespan on shutdown)"""
+    tasks = list(_background.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _background.clear()
+
+
+# --- Calendar ---
+
+def _list_calendar_changes(creds: Credentials, sync_token: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+    """All pages of events.list; with a sync token only the changes (blocking)"""
+    calendar = get_service('calendar', 'v3')
+    http = authorized_http(creds)
+    params = dict(calendarId='primary', singleEvents=True, maxResults=250)
+    if sync_token:
+        params['syncToken'] = sync_token
+    else:
+        time_min = datetime.datetime.utcnow() - datetime.timedelta(days=CALENDAR_SYNC_PAST_DAYS)
+        params['timeMin'] = time_min.isoformat() + 'Z'
+
+    items, page_token = [], None
+    while True:
+        response = execute(calendar.events().list(pageToken=page_token, **params), http)
+        items += response.get('items', [])
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return items, response.get('nextSyncToken')
+
+
+def _parse_time(value: dict) -> Tuple[datetime.datetime, str, bool]:
+    """(UTC datetime, original string, all-day) for an event start/end"""
+    if 'dateTime' in value:
+        parsed = datetime.datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return parsed, value['dateTime'], False
+    return datetime.datetime.fromisoformat(value['date']), value['date'], True
+
+
+async def _apply_calendar_changes(user_id: int, items: List[dict], sync_token: Optional[str], full: bool):
+    async with async_session_maker() as session:
+        if full:
+            await session.execute(delete(CalendarEvent).where(CalendarEvent.user_id == user_id))
+            existing = {}
+        else:
+            result = await session.execute(select(CalendarEvent).where(
+                CalendarEvent.user_id == user_id,
+                CalendarEvent.event_id.in_([item['id'] for item in items])
+            ))
+            existing = {event.event_id: event for event in result.scalars()}
+
+        for item in items:
+            event = existing.get(item['id'])
+            if item.get('status') == 'cancelled' or 'start' not in item:
+                if event is not None:
+                    await session.delete(event)
+                continue
+            start, start_local, all_day = _parse_time(item['start'])
+            end = _parse_time(item['end'])[0] if 'end' in item else start
+            if event is None:
+                event = CalendarEvent(user_id=user_id, event_id=item['id'], title='', start=start, end=end,
+                                      start_local=start_local)
+                existing[item['id']] = event
+            event.title = item.get('summary', '(No title)')
+            event.start, event.end, event.start_local, event.all_day = start, end, start_local, all_day
+            event.updated_at = datetime.datetime.utcnow()
+            session.add(event)
+
+        await _save_sync_state(session, user_id, CALENDAR, sync_token, full)
+        await session.commit()
+
+
+async def sync_calendar(user_id: int, creds: Credentials, full: bool = False) -> int:
+    """Pull calendar changes into CalendarEvent; returns the number of changed events"""
+    async with _lock(user_id, CALENDAR):
+        state = await get_sync_state(user_id, CALENDAR)
+        sync_token = None if full or state is None else state.cursor
+        try:
+            items, next_token = await run_blocking("google", _list_calendar_changes, creds, sync_token)
+        except HttpError as e:
+            if e.resp.status != 410 or sync_token is None:
+                raise
+            print(f"Calendar sync token expired for user {user_id}, doing a full resync")
+            sync_token = None
+            items, next_token = await run_blocking("google", _list_calendar_changes, creds, None)
+        await _apply_calendar_changes(user_id, items, next_token, full=sync_token is None)
+        return len(items)
+
+
+async def ensure_calendar_synced(user_id: int, creds: Credentials):
+    """Sync inline on first use, otherwise refresh a stale local copy in the background"""
+    state = await get_sync_state(user_id, CALENDAR)
+    if state is None or state.cursor is None:
+        await sync_calendar(user_id, creds)
+    elif _is_stale(state, CALENDAR_SYNC_INTERVAL_SECONDS):
+        _schedule(user_id, CALENDAR, lambda: sync_calendar(user_id, creds))
+
+
+async def calendar_events(session, user_id: int, start: datetime.datetime, end: datetime.datetime) -> List[CalendarEvent]:
+    """Events overlapping [start, end) from the local copy, in start order"""
+    result = await session.execute(
+        select(CalendarEvent)
+        .where(CalendarEvent.user_id == user_id, CalendarEvent.start < end, CalendarEvent.end > start)
+        .order_by(CalendarEvent.start)
+    )
+    return list(result.scalars())
+
+
+# --- Gmail ---
+
+class HistoryExpired(Exception):
+    """The stored historyId is too old for users.history.list (HTTP 404)"""
+
+
+def _fetch_headers(gmail, http, message_ids: List[str]) -> List[dict]:
+    """Metadata (id, thread, labels, date, From/Subject) for message_ids, in batches (blocking)"""
+    messages = {}
+
+    def collect(request_id, response, exception):
+        if exception is not None:
+            print(f"Gmail metadata for {request_id} failed: {exception}")
+            return
+        messages[request_id] = response
+
+    for offset in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        batch = gmail.new_batch_http_request(callback=collect)
+        for message_id in message_ids[offset:offset + GMAIL_BATCH_SIZE]:
+            batch.add(gmail.users().messages().get(
+                userId='me', id=message_id, format='metadata', metadataHeaders=['From', 'Subject'],
+                fields='id,threadId,labelIds,internalDate,payload/headers'
+            ), request_id=message_id)
+        execute_batch(batch, "gmail.users.messages.get.batch", http)
+    return [messages[message_id] for message_id in message_ids if message_id in messages]
+
+
+def _list_gmail_full(creds: Credentials) -> Tuple[List[dict], str]:
+    """Headers of recent messages plus the mailbox historyId to continue from (blocking)"""
+    gmail = get_service('gmail', 'v1')
+    http = authorized_http(creds)
+    # Take the history id first so nothing that arrives during the listing is missed
+    history_id = execute(gmail.users().getProfile(userId='me', fields='historyId'), http)['historyId']
+    message_ids, page_token = [], None
+    while len(message_ids) < GMAIL_SYNC_MAX_MESSAGES:
+        response = execute(gmail.users().messages().list(
+            userId='me', q=f'newer_than:{GMAIL_SYNC_DAYS}d', pageToken=page_token,
+            maxResults=min(500, GMAIL_SYNC_MAX_MESSAGES - len(message_ids)),
+            fields='messages/id,nextPageToken'
+        ), http)
+        message_ids += [msg['id'] for msg in response.get('messages', [])]
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+    return _fetch_headers(gmail, http, message_ids), history_id
+
+
+def _list_gmail_history(creds: Credentials, start_history_id: str):
+    """
+    Changes since start_history_id (blocking).
+    Returns (headers of added messages, deleted ids, {id: current labels}, new history id).
+    """
+    gmail = get_service('gmail', 'v1')
+    http = authorized_http(creds)
+    added, deleted, labels = [], set(), {}
+    history_id, page_token = start_history_id, None
+    while True:
+        try:
+            response = execute(gmail.users().history().list(
+                userId='me', startHistoryId=start_history_id, pageToken=page_token,
+                historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'],
+                fields='history(messagesAdded/message/id,messagesDeleted/message/id,'
+                       'labelsAdded/message(id,labelIds),labelsRemoved/message(id,labelIds)),'
+                       'historyId,nextPageToken'
+            ), http)
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise HistoryExpired() from e
+            raise
+        for record in response.get('history', []):
+            for entry in record.get('messagesAdded', []):
+                added.append(entry['message']['id'])
+                deleted.discard(entry['message']['id'])
+            for entry in record.get('messagesDeleted', []):
+                deleted.add(entry['message']['id'])
+            for entry in record.get('labelsAdded', []) + record.get('labelsRemoved', []):
+                labels[entry['message']['id']] = entry['message'].get('labelIds', [])
+        history_id = response.get('historyId', history_id)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+    added = [message_id for message_id in dict.fromkeys(added) if message_id not in deleted]
+    return _fetch_headers(gmail, http, added), deleted, labels, history_id
+
+
+def _labels_field(label_ids: List[str]) -> str:
+    return "," + ",".join(label_ids) + "," if label_ids else ""
+
+
+def _message_fields(message: dict) -> dict:
+    headers = message.get('payload', {}).get('headers', [])
+    return {
+        "thread_id": message.get('threadId'),
+        "sender": next((h['value'] for h in headers if h['name'] == 'From'), "Unknown"),
+        "subject": next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject"),
+        "date": datetime.datetime.utcfromtimestamp(int(message.get('internalDate', 0)) / 1000),
+        "labels": _labels_field(message.get('labelIds', [])),
+    }
+
+
+async def _apply_gmail_changes(user_id: int, messages: List[dict], deleted, labels: Dict[str, List[str]],
+                               history_id: str, full: bool):
+    async with async_session_maker() as session:
+        if full:
+            await session.execute(delete(EmailMessage).where(EmailMessage.user_id == user_id))
+            existing = {}
+        else:
+            ids = [message['id'] for message in messages] + list(deleted) + list(labels)
+            result = await session.execute(select(EmailMessage).where(
+                EmailMessage.user_id == user_id,
+                EmailMessage.message_id.in_(ids)
+            ))
+            existing = {message.message_id: message for message in result.scalars()}
+
+        for message_id in deleted:
+            if message_id in existing:
+                await session.delete(existing.pop(message_id))
+        for message_id, label_ids in labels.items():
+            if message_id in existing:  # Label changes on messages outside the synced window are ignored
+                existing[message_id].labels = _labels_field(label_ids)
+                session.add(existing[message_id])
+        for message in messages:
+            row = existing.get(message['id']) or EmailMessage(user_id=user_id, message_id=message['id'],
+                                                              date=datetime.datetime.utcnow())
+            for name, value in _message_fields(message).items():
+                setattr(row, name, value)
+            session.add(row)
+
+        await _save_sync_state(session, user_id, GMAIL, history_id, full)
+        await session.commit()
+
+
+async def sync_gmail(user_id: int, creds: Credentials, full: bool = False) -> int:
+    """Pull Gmail changes into EmailMessage; returns the number of changed messages"""
+    async with _lock(user_id, GMAIL):
+        state = await get_sync_state(user_id, GMAIL)
+        history_id = None if full or state is None else state.cursor
+        if history_id:
+            try:
+                messages, deleted, labels, history_id = await run_blocking(
+                    "google", _list_gmail_history, creds, history_id)
+                await _apply_gmail_changes(user_id, messages, deleted, labels, history_id, full=False)
+                return len(messages) + len(deleted) + len(labels)
+            except HistoryExpired:
+                print(f"Gmail history id expired for user {user_id}, doing a full resync")
+        messages, history_id = await run_blocking("google", _list_gmail_full, creds)
+        await _apply_gmail_changes(user_id, messages, set(), {}, history_id, full=True)
+        return len(messages)
+
+
+async def ensure_gmail_synced(user_id: int, creds: Credentials):
+    """Sync inline on first use, otherwise refresh a stale local copy in the background"""
+    state = await get_sync_state(user_id, GMAIL)
+    if state is None or state.cursor is None:
+        await sync_gmail(user_id, creds)
+    elif _is_stale(state, GMAIL_SYNC_INTERVAL_SECONDS):
+        _schedule(user_id, GMAIL, lambda: sync_gmail(user_id, creds))
+
+
+async def email_messages(session, user_id: int, limit: int, label: Optional[str] = "INBOX",
+                         unread: Optional[bool] = None) -> List[EmailMessage]:
+    """Newest messages from the local index, optionally filtered by label / unread state"""
+    statement = select(EmailMessage).where(EmailMessage.user_id == user_id)
+    if label:
+        statement = statement.where(EmailMessage.labels.contains(f",{label},", autoescape=True))
+    if unread is not None:
+        has_unread = EmailMessage.labels.contains(",UNREAD,")
+        statement = statement.where(has_unread if unread else ~has_unread)
+    result = await session.execute(statement.order_by(EmailMessage.date.desc()).limit(limit))
+    return list(result.scalars())
@@ -13,6 +13,7 @@ import httpx
 import asyncio
 from datetime import datetime
 from backend.routers.workouts import parse_strong_workout
+from backend.http_clients import get_client
 
 
 async def handle_workout_message(text: str, api_url: str = "http://localhost:8080") -> dict:
@@ -37,24 +38,24 @@ async def handle_workout_message(text: str, api_url: str = "http://localhost:808
     
     # Post to the API
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{api_url}/api/workouts",
-                json=parsed,
-                timeout=10
-            )
-            response.raise_for_status()
-            workout_data = response.json()
-            
-            # Count exercises and sets
-            total_exercises = len(parsed["exercises"])
-            total_sets = sum(len(e["sets"]) for e in parsed["exercises"])
-            
-            return {
-                "status": "success",
-                "message": f"✅ Logged {parsed['name']} ({total_exercises} exercises, {total_sets} sets)",
-                "workout_id": workout_data.get("id")
-            }
+        client = get_client("lifeos")
+        response = await client.post(
+            f"{api_url}/api/workouts",
+            json=parsed,
+            timeout=10
+        )
+        response.raise_for_status()
+        workout_data = response.json()
+        
+        # Count exercises and sets
+        total_exercises = len(parsed["exercises"])
+        total_sets = sum(len(e["sets"]) for e in parsed["exercises"])
+        
+        return {
+            "status": "success",
+            "message": f"✅ Logged {parsed['name']} ({total_exercises} exercises, {total_sets} sets)",
+            "workout_id": workout_data.get("id")
+        }
     
     except httpx.HTTPError as e:
         return {
@@ -66,23 +67,23 @@ async def handle_workout_message(text: str, api_url: str = "http://localhost:808
 async def get_workout_summary(api_url: str = "http://localhost:8080") -> str:
     """Get a summary of recent workouts"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{api_url}/api/workouts/recent?limit=5",
-                timeout=10
-            )
-            response.raise_for_status()
-            workouts = response.json()
-            
-            if not workouts:
-                return "No workouts logged yet."
-            
-            lines = ["📋 Recent Workouts:\n"]
-            for w in workouts:
-                date_str = datetime.fromisoformat(w["date"]).strftime("%a %d %b")
-                lines.append(f"• {w['name']} ({date_str})")
-            
-            return "\n".join(lines)
+        client = get_client("lifeos")
+        response = await client.get(
+            f"{api_url}/api/workouts/recent?limit=5",
+            timeout=10
+        )
+        response.raise_for_status()
+        workouts = response.json()
+        
+        if not workouts:
+            return "No workouts logged yet."
+        
+        lines = ["📋 Recent Workouts:\n"]
+        for w in workouts:
+            date_str = datetime.fromisoformat(w["date"]).strftime("%a %d %b")
+            lines.append(f"• {w['name']} ({date_str})")
+        
+        return "\n".join(lines)
     
     except Exception as e:
         return f"Error fetching workouts: {str(e)}"
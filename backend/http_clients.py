@@ -0,0 +1,160 @@
+"""
+Shared upstream HTTP clients.
+
+One pooled httpx.AsyncClient per provider, created in main.lifespan and closed
+on shutdown, so warm requests reuse keep-alive connections instead of paying a
+fresh TCP+TLS handshake every time. Every client goes through
+InstrumentedTransport, which records per-provider/per-endpoint latency,
+status, bytes received and connection retries in backend.metrics.
+"""
+import importlib.util
+import time
+from typing import Callable, Dict
+
+import httpx
+
+from backend.metrics import endpoint_label, record_upstream
+
+# HTTP/2 needs the optional 'h2' package (installed via httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Per-provider client settings. Providers not listed here fall back to DEFAULT_CONFIG.
+DEFAULT_CONFIG = {
+    "http2": False,
+    "timeout": 10.0,
+    "max_connections": 10,
+    "max_keepalive": 5,
+    "keepalive_expiry": 30.0,
+    "follow_redirects": False,
+    "headers": {},
+    "connect_retries": 1,  # Only retried when the connection failed, i.e. nothing was sent
+}
+
+PROVIDERS: Dict[str, dict] = {
+    "transport": {"timeout": 15.0, "follow_redirects": True},
+    "spotify": {"http2": True, "timeout": 5.0, "max_connections": 20, "max_keepalive": 10, "keepalive_expiry": 60.0},
+    "monzo": {"http2": True, "timeout": 10.0},
+    "weather": {"http2": True, "timeout": 5.0},
+    "homeassistant": {"timeout": 5.0},  # Local HA instance, plain HTTP/1.1
+    "dvla": {"timeout": 10.0},
+    "geocoding": {
+        "timeout": 15.0,
+        "headers": {"User-Agent": "LifeOS/1.0 (contact: lifeos@example.com)"},  # Required by Nominatim
+    },
+    "lifeos": {"timeout": 10.0},  # Calls back into our own API (Telegram handler)
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+class _CountingStream(httpx.AsyncByteStream):
+    """Wraps a response body to count bytes and record the call once the body is done."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[int], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._bytes = 0
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._bytes += len(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close(self._bytes)
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records upstream metrics and retries failed connects."""
+
+    def __init__(self, provider: str, transport: httpx.AsyncBaseTransport, connect_retries: int = 0):
+        self.provider = provider
+        self._transport = transport
+        self.connect_retries = connect_retries
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = endpoint_label(request.url.path)
+        started = time.perf_counter()
+        retries = 0
+        while True:
+            try:
+                response = await self._transport.handle_async_request(request)
+                break
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if retries >= self.connect_retries:
+                    record_upstream(self.provider, endpoint, "error", time.perf_counter() - started, retries=retries)
+                    raise
+                retries += 1
+            except Exception:
+                record_upstream(self.provider, endpoint, "error", time.perf_counter() - started, retries=retries)
+                raise
+
+        def on_close(bytes_received: int):
+            record_upstream(self.provider, endpoint, response.status_code,
+                            time.perf_counter() - started, bytes_received, retries)
+
+        response.stream = _CountingStream(response.stream, on_close)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _build_client(provider: str) -> httpx.AsyncClient:
+    """Create a pooled client for a provider using its configured limits and timeouts."""
+    config = {**DEFAULT_CONFIG, **PROVIDERS.get(provider, {})}
+    limits = httpx.Limits(
+        max_connections=config["max_connections"],
+        max_keepalive_connections=config["max_keepalive"],
+        keepalive_expiry=config["keepalive_expiry"],
+    )
+    transport = httpx.AsyncHTTPTransport(http2=config["http2"] and HTTP2_AVAILABLE, limits=limits)
+    return httpx.AsyncClient(
+        transport=InstrumentedTransport(provider, transport, config["connect_retries"]),
+        timeout=httpx.Timeout(config["timeout"]),
+        follow_redirects=config["follow_redirects"],
+        headers=config["headers"],
+    )
+
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """
+    Get the shared client for a provider.
+    Clients are normally created by start_clients() at startup; outside the app
+    (scripts, handlers) they are created lazily on first use.
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = _build_client(provider)
+        _clients[provider] = client
+    return client
+
+
+def http_client(provider: str) -> Callable[[], httpx.AsyncClient]:
+    """FastAPI dependency factory: Depends(http_client("spotify"))."""
+    def dependency() -> httpx.AsyncClient:
+        return get_client(provider)
+    return dependency
+
+
+async def start_clients():
+    """Create clients for every configured provider (called from main.lifespan)."""
+    for provider in PROVIDERS:
+        get_client(provider)
+    print(f"HTTP clients ready: {', '.join(PROVIDERS)} (HTTP/2 {'on' if HTTP2_AVAILABLE else 'off'})")
+
+
+async def close_clients():
+    """Close all pooled clients (called from main.lifespan on shutdown)."""
+    for provider, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"Error closing {provider} HTTP client: {e}")
+    _clients.clear()
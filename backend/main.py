@@ -1,5 +1,6 @@
-from fastapi import FastAPI, Header, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 import logging
 import os
@@ -7,10 +8,17 @@ from typing import Optional
 
 # NOTE: Imports must use the leading dot ('.') since uvicorn runs from the parent directory.
 from backend.database import engine
-from backend.models import SQLModel, User, UserToken, Plant, Car, MaintenanceRecord, UserConfig, Workout, Exercise, Set
+from backend.auth import principals, require_user, start_last_login_writer, stop_last_login_writer
+from backend.http_clients import start_clients, close_clients
+from backend.executors import pool_stats, run_blocking, shutdown_pools
+from backend.cache import COUNTERS, cache, cancel_refreshes
+from backend import garmin_sync, google_api, google_sync, singleflight
+from backend.metrics import MetricsMiddleware, registry, render_metrics
+from backend.tokens import tokens, start_token_refresher, stop_token_refresher
+from backend.models import SQLModel, User, UserToken, TokenRefreshStatus, SyncState, CalendarEvent, EmailMessage, GarminDailyStats, GarminSleep, GarminBodyComposition, GarminActivity, GarminActivityTrack, Plant, Car, MaintenanceRecord, UserConfig, Workout, Exercise, Set
 
 # Import all your routers
-from .routers import transport, google, smarthome, plants, spotify, garmin, car, monzo, weather, user, workouts
+from .routers import transport, google, smarthome, plants, spotify, garmin, car, monzo, weather, user, workouts, dashboard, stream
 from .routers.auth_routes import router as auth_router
 
 # Configure access logger
@@ -37,8 +45,27 @@ async def lifespan(app: FastAPI):
     
     uvicorn_logger.addFilter(EndpointFilter())
     
+    # Shared upstream HTTP clients (keep-alive pools per provider)
+    await start_clients()
+    start_last_login_writer()
+    # Refresh OAuth tokens ahead of expiry so requests don't pay for it
+    start_token_refresher()
+    # Parse Google discovery documents once, off the request path
+    await run_blocking("google", google_api.warm_services)
+    # Log in to Garmin once; the client is shared and its session kept fresh
+    await garmin.start_garmin()
+    
     yield
     print("LifeOS Backend shutting down...")
+    await stream.hub.stop_all()
+    await stop_token_refresher()
+    await garmin.stop_garmin()
+    await google_sync.cancel_syncs()
+    await garmin_sync.cancel_syncs()
+    await cancel_refreshes()
+    await close_clients()
+    await stop_last_login_writer()
+    shutdown_pools()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -60,6 +87,8 @@ app.add_middleware(
     expose_headers=["*"],
     max_age=3600,
 )
+# Added last so it wraps CORS too and times the whole request
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(transport.router, prefix="/api")
 app.include_router(google.router, prefix="/api/google")
@@ -73,6 +102,8 @@ app.include_router(weather.router, prefix="/api/weather")
 app.include_router(user.router, prefix="/api/user")
 app.include_router(workouts.router, prefix="")
 app.include_router(auth_router, prefix="/api/auth")
+app.include_router(dashboard.router, prefix="/api/dashboard")
+app.include_router(stream.router, prefix="/api/stream")
 
 @app.get("/api/init-db")
 async def init_db(x_init_secret: Optional[str] = Header(default=None)):
@@ -95,4 +126,47 @@ async def read_root():
 @app.get("/health")
 async def health_check():
     """Fast health check endpoint for frontend"""
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/api/cache/stats")
+async def cache_stats(user: User = Depends(require_user)):
+    """In-memory cache size and hit/miss/eviction counters per namespace (includes per-user entries, so auth is required)"""
+    return {**cache.stats(), "singleflight": singleflight.group.stats(), "principals": principals.stats(), "tokens": tokens.stats(), "thread_pools": pool_stats()}
+
+
+def _cache_metrics():
+    """Expose cache and single-flight counters alongside the request metrics"""
+    stats = cache.stats()
+    lines = [
+        "# HELP lifeos_cache_entries Entries in the in-memory cache",
+        "# TYPE lifeos_cache_entries gauge",
+        f"lifeos_cache_entries {stats['entries']}",
+        "# HELP lifeos_cache_events_total Cache hits, misses, evictions and refreshes per namespace",
+        "# TYPE lifeos_cache_events_total counter",
+    ]
+    for namespace, counters in stats["namespaces"].items():
+        for counter in COUNTERS:
+            lines.append(f'lifeos_cache_events_total{{namespace="{namespace}",event="{counter}"}} {counters[counter]}')
+    flights = singleflight.group.stats()
+    lines += [
+        "# HELP lifeos_singleflight_in_flight Coalesced upstream calls currently running",
+        "# TYPE lifeos_singleflight_in_flight gauge",
+        f"lifeos_singleflight_in_flight {flights['in_flight']}",
+        "# HELP lifeos_singleflight_calls_total Single-flight calls by role (leaders ran the call, followers shared it)",
+        "# TYPE lifeos_singleflight_calls_total counter",
+        f'lifeos_singleflight_calls_total{{role="leader"}} {flights["leaders"]}',
+        f'lifeos_singleflight_calls_total{{role="follower"}} {flights["followers"]}',
+    ]
+    return lines
+
+
+registry.add_collector(_cache_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(x_metrics_secret: Optional[str] = Header(default=None)):
+    """Prometheus text exposition of per-route request metrics. Requires METRICS_SECRET header when set."""
+    expected = os.getenv("METRICS_SECRET")
+    if expected and x_metrics_secret != expected:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,340 @@
+"""
+Lightweight in-process metrics with a Prometheus text exposition.
+
+MetricsMiddleware records, per route template and method: request counts by
+status, error counts, a latency histogram (with p50/p95/p99 estimates) and an
+in-flight gauge. Upstream calls (httpx transports in http_clients, and the
+sync Google/Garmin SDKs via track_upstream) are recorded per provider and
+endpoint. Everything is rendered at /metrics by render_metrics().
+"""
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.routing import Match
+
+# Latency buckets in seconds (upper bounds, +Inf is implicit)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()  # SDK calls record from worker threads
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, labels: Labels = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, labels: Labels, value: float):
+        with self._lock:
+            self.values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * (n_buckets + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are estimated by interpolating within buckets."""
+
+    def __init__(self, name: str, help: str, labelnames: Labels = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Labels, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = _HistogramSeries(len(self.buckets))
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.sum += value
+            series.count += 1
+
+    def quantile(self, labels: Labels, q: float) -> Optional[float]:
+        series = self.series.get(labels)
+        if series is None or series.count == 0:
+            return None
+        rank = q * series.count
+        cumulative = 0
+        for i, count in enumerate(series.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i >= len(self.buckets):
+                    return lower  # Beyond the last bucket: best we can say is "at least"
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self.series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series.sum!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series.count}")
+
+        # Percentile estimates as a summary family, so p50/p95/p99 are readable without PromQL
+        summary = f"{self.name.rsplit('_seconds', 1)[0]}_quantile_seconds"
+        lines += [f"# HELP {summary} Estimated quantiles of {self.name}", f"# TYPE {summary} summary"]
+        for labels, series in items:
+            for q in QUANTILES:
+                value = self.quantile(labels, q)
+                quantile = f'quantile="{q}"'
+                value = "NaN" if value is None else repr(value)
+                lines.append(f"{summary}{_format_labels(self.labelnames, labels, quantile)} {value}")
+            lines.append(f"{summary}_sum{_format_labels(self.labelnames, labels)} {series.sum!r}")
+            lines.append(f"{summary}_count{_format_labels(self.labelnames, labels)} {series.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        """Register a callable returning extra exposition lines, evaluated at scrape time."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collector in self.collectors:
+            try:
+                lines += collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "lifeos_http_requests_total", "HTTP requests by route template, method and status",
+    ("method", "route", "status")))
+http_errors = registry.register(Counter(
+    "lifeos_http_request_errors_total", "HTTP requests that raised or returned 5xx",
+    ("method", "route")))
+http_latency = registry.register(Histogram(
+    "lifeos_http_request_duration_seconds", "HTTP request latency",
+    ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "lifeos_http_requests_in_flight", "HTTP requests currently being served",
+    ("method", "route")))
+
+upstream_requests = registry.register(Counter(
+    "lifeos_upstream_requests_total", "Upstream calls by provider, endpoint and status (\"error\" = no response)",
+    ("provider", "endpoint", "status")))
+upstream_latency = registry.register(Histogram(
+    "lifeos_upstream_request_duration_seconds", "Upstream call latency",
+    ("provider", "endpoint")))
+upstream_bytes = registry.register(Counter(
+    "lifeos_upstream_response_bytes_total", "Response body bytes received from upstreams",
+    ("provider", "endpoint")))
+upstream_retries = registry.register(Counter(
+    "lifeos_upstream_retries_total", "Upstream retries (connection retries, SDK-level retries)",
+    ("provider", "endpoint")))
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+# Path segments that look like ids (contain a digit, or are long opaque tokens) are
+# collapsed so e.g. /v3/uk/bus/stop/8220DB000334/live.json doesn't create a series per stop.
+# API versions (v1, 2.5) are kept.
+_VERSION_SEGMENT = re.compile(r"^v\d+$|^\d+\.\d+$")
+_ID_SEGMENT = re.compile(r"\d|^[A-Za-z0-9_-]{24,}$")
+
+
+def endpoint_label(path: str) -> str:
+    """Normalise a URL path into a low-cardinality endpoint label."""
+    segments = [
+        seg if _VERSION_SEGMENT.match(seg) or not _ID_SEGMENT.search(seg) else ":id"
+        for seg in path.split("/") if seg
+    ]
+    return "/" + "/".join(segments)
+
+
+def record_upstream(provider: str, endpoint: str, status, seconds: float,
+                    bytes_received: int = 0, retries: int = 0):
+    labels = (provider, endpoint)
+    upstream_requests.inc(labels + (str(status),))
+    upstream_latency.observe(labels, seconds)
+    if bytes_received:
+        upstream_bytes.inc(labels, bytes_received)
+    if retries:
+        upstream_retries.inc(labels, retries)
+
+
+def status_from_exception(e: Exception):
+    """Best-effort HTTP status from SDK exceptions (googleapiclient, requests, garth)."""
+    resp = getattr(e, "resp", None)  # googleapiclient.errors.HttpError
+    if resp is not None and getattr(resp, "status", None):
+        return resp.status
+    for candidate in (e, getattr(e, "error", None), e.__cause__):  # garth wraps requests.HTTPError
+        response = getattr(candidate, "response", None)
+        if response is not None and getattr(response, "status_code", None):
+            return response.status_code
+    return "error"
+
+
+class UpstreamCall:
+    """Mutable record for one SDK call; wrappers fill in status/bytes/retries they can see."""
+    __slots__ = ("status", "bytes_received", "retries")
+
+    def __init__(self):
+        self.status = 200
+        self.bytes_received = 0
+        self.retries = 0
+
+
+_current_call = threading.local()
+
+
+def current_upstream_call() -> Optional[UpstreamCall]:
+    """The SDK call being tracked on this thread, for transport hooks to attribute bytes/retries to."""
+    return getattr(_current_call, "call", None)
+
+
+@contextmanager
+def track_upstream(provider: str, endpoint: str):
+    """
+    Time a blocking SDK call and record it as an upstream request:
+
+        with track_upstream("garmin", "get_stats"):
+            stats = client.get_stats(day)
+    """
+    call = UpstreamCall()
+    previous = current_upstream_call()
+    _current_call.call = call
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        call.status = status_from_exception(e)
+        raise
+    finally:
+        _current_call.call = previous
+        record_upstream(provider, endpoint, call.status, time.perf_counter() - started,
+                        call.bytes_received, call.retries)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no request body buffering, safe for streaming responses)."""
+
+    MAX_ROUTE_CACHE = 2048
+
+    def __init__(self, app):
+        self.app = app
+        self._route_cache: Dict[Tuple[str, str], str] = {}
+
+    def _route_template(self, scope) -> str:
+        """Resolve the route template ("/api/workouts/{workout_id}") so label cardinality stays bounded."""
+        key = (scope["method"], scope["path"])
+        template = self._route_cache.get(key)
+        if template is not None:
+            return template
+        template = "unmatched"
+        partial = None
+        for route in getattr(scope.get("app"), "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        else:
+            template = partial or template
+        if len(self._route_cache) >= self.MAX_ROUTE_CACHE:
+            self._route_cache.clear()
+        self._route_cache[key] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        labels = (scope["method"], self._route_template(scope))
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc(labels)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status["code"] = 500
+            raise
+        finally:
+            http_in_flight.dec(labels)
+            http_latency.observe(labels, time.perf_counter() - started)
+            http_requests.inc(labels + (str(status["code"]),))
+            if status["code"] >= 500:
+                http_errors.inc(labels)
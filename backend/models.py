@@ -1,5 +1,6 @@
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from datetime import datetime, date
 
 class User(SQLModel, table=True):
@@ -31,6 +32,127 @@ class UserToken(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     user: Optional[User] = Relationship(back_populates="tokens")
 
+class TokenRefreshStatus(SQLModel, table=True):
+    """Outcome of the last OAuth refresh per user and service (written by backend/tokens.py)"""
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    service: str = Field(index=True)
+    last_attempt_at: Optional[datetime] = None
+    last_success_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    consecutive_failures: int = 0
+
+class SyncState(SQLModel, table=True):
+    """Incremental sync cursor per user and source (Calendar syncToken, Gmail historyId)"""
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    source: str = Field(index=True)  # "google_calendar", "gmail"
+    cursor: Optional[str] = None
+    last_synced_at: Optional[datetime] = None
+    last_full_sync_at: Optional[datetime] = None
+
+class CalendarEvent(SQLModel, table=True):
+    """Local copy of Google Calendar events, kept current by incremental sync (backend/google_sync.py)"""
+    __table_args__ = (
+        Index("ix_calendarevent_user_start", "user_id", "start"),
+        {"extend_existing": True},
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    event_id: str = Field(index=True)
+    title: str
+    start: datetime  # UTC, for range queries and ordering
+    end: datetime
+    start_local: str  # As sent by Google ("2026-01-05T09:00:00+00:00" or "2026-01-05" for all-day)
+    all_day: bool = False
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class EmailMessage(SQLModel, table=True):
+    """Local Gmail header index, kept current by historyId sync (backend/google_sync.py)"""
+    __table_args__ = (
+        Index("ix_emailmessage_user_date", "user_id", "date"),
+        {"extend_existing": True},
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    message_id: str = Field(index=True)
+    thread_id: Optional[str] = None
+    sender: str = ""
+    subject: str = ""
+    date: datetime  # Gmail internalDate, UTC
+    labels: str = ""  # ",INBOX,UNREAD," so label filters are a LIKE '%,INBOX,%'
+
+class GarminDailyStats(SQLModel, table=True):
+    """Garmin daily summary, one row per day (backend/garmin_sync.py)"""
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date = Field(unique=True, index=True)
+    steps: Optional[int] = None
+    calories: Optional[float] = None
+    distance_meters: Optional[float] = None
+    moderate_minutes: Optional[int] = None
+    vigorous_minutes: Optional[int] = None
+    floors: Optional[float] = None
+    resting_hr: Optional[int] = None
+    max_hr: Optional[int] = None
+    min_hr: Optional[int] = None
+    avg_stress: Optional[int] = None
+    max_stress: Optional[int] = None
+    fetched_at: datetime  # Local time; rows fetched before day + 2 may still change
+
+class GarminSleep(SQLModel, table=True):
+    """Garmin sleep summary per night, keyed by the day it ends on (backend/garmin_sync.py)"""
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date = Field(unique=True, index=True)
+    sleep_seconds: int = 0  # 0 when nothing was recorded
+    deep_seconds: Optional[int] = None
+    light_seconds: Optional[int] = None
+    rem_seconds: Optional[int] = None
+    awake_seconds: Optional[int] = None
+    score: Optional[int] = None
+    sleep_start: Optional[int] = None  # Local epoch milliseconds, as sent by Garmin
+    sleep_end: Optional[int] = None
+    fetched_at: datetime
+
+class GarminBodyComposition(SQLModel, table=True):
+    """Garmin body composition per day (backend/garmin_sync.py)"""
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date = Field(unique=True, index=True)
+    weight_grams: Optional[float] = None
+    fetched_at: datetime
+
+class GarminActivity(SQLModel, table=True):
+    """Garmin activity summaries (backend/garmin_sync.py)"""
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    activity_id: int = Field(unique=True, index=True)
+    name: Optional[str] = None
+    type: Optional[str] = None
+    start_time_local: str = Field(index=True)  # "2026-01-05 07:30:00", as sent by Garmin
+    duration_seconds: Optional[float] = None
+    distance_meters: Optional[float] = None
+    calories: Optional[float] = None
+    avg_hr: Optional[float] = None
+    max_hr: Optional[float] = None
+    fetched_at: datetime
+
+class GarminActivityTrack(SQLModel, table=True):
+    """GPS track of a Garmin activity as encoded polylines per detail level (backend/tracks.py)"""
+    __table_args__ = {"extend_existing": True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    activity_id: int = Field(unique=True, index=True)
+    points: int = 0  # Recorded points; 0 for activities without GPS
+    levels: str = "{}"  # JSON: {"full": {"points": n, "polyline": "..."}, "medium": {...}, ...}
+    min_lat: Optional[float] = None
+    max_lat: Optional[float] = None
+    min_lon: Optional[float] = None
+    max_lon: Optional[float] = None
+    fetched_at: datetime
+
 class Plant(SQLModel, table=True):
     __table_args__ = {"extend_existing": True}
     id: Optional[int] = Field(default=None, primary_key=True)
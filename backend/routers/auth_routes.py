@@ -2,14 +2,14 @@
 Email/password authentication endpoints.
 Google OAuth is handled in routers/google.py.
 """
-from fastapi import APIRouter, HTTPException, Depends, Response, status
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
 from sqlmodel import Session, select
 from pydantic import BaseModel
 from typing import Optional
 from passlib.context import CryptContext
 from backend.database import get_sync_session
 from backend.models import User
-from backend.auth import create_access_token, set_auth_cookie
+from backend.auth import create_access_token, set_auth_cookie, invalidate_principal
 from datetime import datetime
 import os
 
@@ -71,6 +71,7 @@ def register(
     session.add(user)
     session.commit()
     session.refresh(user)
+    invalidate_principal(user_id=user.id)
 
     token = create_access_token(user.id, user.email)
     set_auth_cookie(response, token)
@@ -103,6 +104,7 @@ def login(
     user.last_login = datetime.utcnow()
     session.add(user)
     session.commit()
+    invalidate_principal(user_id=user.id)
 
     token = create_access_token(user.id, user.email)
     set_auth_cookie(response, token)
@@ -110,8 +112,9 @@ def login(
 
 
 @router.post("/logout")
-def logout(response: Response):
+def logout(request: Request, response: Response):
     """Clear the session cookie."""
+    invalidate_principal(token=request.cookies.get("access_token"))
     response.delete_cookie(
         key="access_token",
         path="/",
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
@@ -7,13 +7,14 @@ import httpx
 import os
 from ..database import engine
 from ..models import Car, MaintenanceRecord
+from ..http_clients import http_client
 
 router = APIRouter()
 
 # --- LICENSE PLATE LOOKUP ---
 
 @router.get("/lookup/{license_plate}")
-async def lookup_vehicle(license_plate: str):
+async def lookup_vehicle(license_plate: str, client: httpx.AsyncClient = Depends(http_client("dvla"))):
     """
     Lookup vehicle details by UK license plate
     Uses DVLA vehicle data API or carcheck.co.uk API
@@ -26,50 +27,48 @@ async def lookup_vehicle(license_plate: str):
     
     if dvla_api_key:
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://driver-vehicle-licensing.api.gov.uk/vehicle-enquiry/v1/vehicles",
-                    headers={
-                        "x-api-key": dvla_api_key,
-                        "Content-Type": "application/json"
-                    },
-                    json={"registrationNumber": plate}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "found": True,
-                        "make": data.get("make", "").title(),
-                        "model": data.get("model", "").title(),
-                        "year": int(data.get("yearOfManufacture", 0)),
-                        "color": data.get("colour", "").title(),
-                        "fuel_type": data.get("fuelType", "").title(),
-                        "mot_expiry": data.get("motExpiryDate"),
-                        "tax_status": data.get("taxStatus"),
-                        "tax_due": data.get("taxDueDate"),
-                        "license_plate": plate
-                    }
+            response = await client.post(
+                "https://driver-vehicle-licensing.api.gov.uk/vehicle-enquiry/v1/vehicles",
+                headers={
+                    "x-api-key": dvla_api_key,
+                    "Content-Type": "application/json"
+                },
+                json={"registrationNumber": plate}
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "found": True,
+                    "make": data.get("make", "").title(),
+                    "model": data.get("model", "").title(),
+                    "year": int(data.get("yearOfManufacture", 0)),
+                    "color": data.get("colour", "").title(),
+                    "fuel_type": data.get("fuelType", "").title(),
+                    "mot_expiry": data.get("motExpiryDate"),
+                    "tax_status": data.get("taxStatus"),
+                    "tax_due": data.get("taxDueDate"),
+                    "license_plate": plate
+                }
         except Exception as e:
             print(f"DVLA API error: {e}")
     
     # Fallback: Try free UK reg lookup (carcheck.co.uk)
     try:
-        async with httpx.AsyncClient() as client:
-            # Note: This is a placeholder - you'd need to find a free API or use a paid service
-            # Options include:
-            # - carcheck.co.uk API (£)
-            # - dvlacheck.co.uk (£)
-            # - ukvehicledata.co.uk (£)
-            # - rapidapi.com vehicle data APIs
-            
-            # For now, return a message
-            return {
-                "found": False,
-                "message": "Vehicle lookup requires DVLA_API_KEY in .env file",
-                "license_plate": plate,
-                "instructions": "Get API key from https://developer-portal.driver-vehicle-licensing.api.gov.uk/"
-            }
+        # Note: This is a placeholder - you'd need to find a free API or use a paid service
+        # Options include:
+        # - carcheck.co.uk API (£)
+        # - dvlacheck.co.uk (£)
+        # - ukvehicledata.co.uk (£)
+        # - rapidapi.com vehicle data APIs
+        
+        # For now, return a message
+        return {
+            "found": False,
+            "message": "Vehicle lookup requires DVLA_API_KEY in .env file",
+            "license_plate": plate,
+            "instructions": "Get API key from https://developer-portal.driver-vehicle-licensing.api.gov.uk/"
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lookup failed: {str(e)}")
 
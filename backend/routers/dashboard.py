@@ -0,0 +1,107 @@
+"""
+Aggregated dashboard endpoint.
+
+Runs the existing widget endpoints concurrently under one shared deadline and
+returns every widget's payload in a single response, so first paint is one
+round trip instead of ~15. Slow or failing widgets don't hold up the rest:
+each entry carries its own status and timing.
+"""
+from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from backend.auth import require_user
+from backend.database import async_session_maker
+from backend.http_clients import get_client
+from backend.models import User
+from . import garmin, workouts, transport, weather, spotify, monzo, google, plants, car
+
+router = APIRouter()
+
+DEADLINE_SECONDS = float(os.getenv("DASHBOARD_DEADLINE_SECONDS", "8"))
+
+
+async def _with_session(fn: Callable[..., Awaitable], **kwargs):
+    """Call a router function with its own DB session (sessions can't be shared across concurrent tasks)."""
+    async with async_session_maker() as session:
+        return await fn(session=session, **kwargs)
+
+
+# Widget name -> factory returning the coroutine that loads it.
+# Arguments mirror what the frontend widgets request individually.
+WIDGETS: Dict[str, Callable[[User], Awaitable]] = {
+    "garmin_stats": lambda user: garmin.get_stats(),
+    "garmin_sleep": lambda user: garmin.get_sleep(days=7),
+    "garmin_activities": lambda user: garmin.get_recent_activities(limit=10),
+    "garmin_body": lambda user: garmin.get_body_metrics(),
+    "workouts_recent": lambda user: _with_session(workouts.get_recent_workouts, limit=5),
+    "workouts_stats": lambda user: _with_session(workouts.get_workout_stats, days=30),
+    "workouts_habits": lambda user: _with_session(workouts.get_habit_tracker, days=90),
+    "bus": lambda user: transport.get_bus_times(force=False, client=get_client("transport")),
+    "bus_stops": lambda user: transport.get_bus_stops(client=get_client("transport")),
+    "bus_locations": lambda user: transport.get_bus_locations(force=False, client=get_client("transport")),
+    "bus_routes": lambda user: transport.get_bus_routes(),
+    "weather": lambda user: weather.get_weather(client=get_client("weather")),
+    "spotify_track": lambda user: _with_session(spotify.get_current_track, user=user, client=get_client("spotify")),
+    "spotify_queue": lambda user: _with_session(spotify.get_queue, user=user, client=get_client("spotify")),
+    "monzo_balance_chart": lambda user: monzo.get_balance_chart(account_id=None, days=7, user=user, client=get_client("monzo")),
+    "google": lambda user: _with_session(google.get_google_data, user=user),
+    "plants": lambda user: _with_session(plants.get_plants),
+    "cars": lambda user: car.get_cars(),
+}
+
+
+async def _run_widget(name: str, user: User) -> dict:
+    """Load one widget, capturing its result or error and how long it took."""
+    started = time.perf_counter()
+    try:
+        data = await WIDGETS[name](user)
+        result = {"status": "ok", "data": data}
+    except HTTPException as e:
+        result = {"status": "error", "status_code": e.status_code, "error": e.detail}
+    except Exception as e:
+        print(f"Dashboard widget {name} failed: {e}")
+        result = {"status": "error", "status_code": 500, "error": str(e)}
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+@router.get("")
+async def get_dashboard(
+    widgets: Optional[str] = None,
+    deadline: float = DEADLINE_SECONDS,
+    user: User = Depends(require_user)
+):
+    """
+    Load all dashboard widgets concurrently.
+
+    widgets: optional comma-separated subset of widget names (default: all)
+    deadline: seconds to wait before returning whatever has finished; widgets
+        still running are reported as "timeout". Their upstream fetches keep
+        running in the background where cached, so the next load picks them up.
+    """
+    names = [w.strip() for w in widgets.split(",") if w.strip()] if widgets else list(WIDGETS)
+    unknown = [name for name in names if name not in WIDGETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown widgets: {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    tasks = {name: asyncio.create_task(_run_widget(name, user)) for name in names}
+    done, pending = await asyncio.wait(tasks.values(), timeout=max(deadline, 0)) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    for name, task in tasks.items():
+        if task in done:
+            results[name] = task.result()
+        else:
+            results[name] = {"status": "timeout", "elapsed_ms": round(deadline * 1000, 1)}
+
+    return {
+        "widgets": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "deadline_ms": round(deadline * 1000, 1),
+    }
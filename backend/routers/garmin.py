@@ -1,9 +1,23 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from garminconnect import Garmin
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from datetime import datetime, date, timedelta
 import json
+from typing import Literal, Optional
+import numpy as np
+from backend import garmin_sync
+from backend.auth import require_user
+from backend.cache import cache, cached
+from backend.executors import run_blocking
+from backend.metrics import current_upstream_call, status_from_exception, track_upstream
+from backend.models import User
+from backend.singleflight import group
+from backend.timeseries import lttb
+from backend.tracks import decode_polyline
 
 router = APIRouter()
 
@@ -20,182 +34,290 @@ GARMIN_PASSWORD = os.getenv("GARMIN_PASSWORD")
 TOKEN_DIR = os.path.join(BACKEND_DIR, ".garmin_tokens")
 os.makedirs(TOKEN_DIR, exist_ok=True)
 
-# Simple in-memory cache
-_cache = {}
-CACHE_DURATION = timedelta(minutes=10)  # Cache for 10 minutes
-
-def get_cached(key):
-    """Get cached data if it exists and is not expired."""
-    if key in _cache:
-        data, timestamp = _cache[key]
-        if datetime.now() - timestamp < CACHE_DURATION:
-            return data
-    return None
-
-def set_cache(key, data):
-    """Set cached data with current timestamp."""
-    _cache[key] = (data, datetime.now())
-
-def get_garmin_client():
-    """Get authenticated Garmin client."""
-    client = Garmin()
+def _record_response(resp, *args, **kwargs):
+    """requests hook on garth's session: attribute bytes and urllib3 retries to the tracked SDK call."""
+    call = current_upstream_call()
+    if call is not None:
+        call.bytes_received += len(resp.content or b"")
+        retries = getattr(resp.raw, "retries", None)
+        if retries is not None:
+            call.retries += len(retries.history)
+    return resp
+
+def _instrument(client: Garmin) -> Garmin:
+    client.garth.sess.hooks["response"].append(_record_response)
+    return client
+
+def _garmin_call(client: Garmin, method: str, *args):
+    """Call a Garmin SDK method, recording it as an upstream call named after the method."""
+    try:
+        with track_upstream("garmin", method):
+            return getattr(client, method)(*args)
+    except Exception as e:
+        if status_from_exception(e) == 401:
+            reset_garmin_client()  # Session revoked; log in again on the next request
+        raise
+
+# The "garmin" pool (GARMIN_WORKERS, default 4) bounds concurrent SDK calls across all endpoints.
+async def _garmin(method: str, *args):
+    """Call a Garmin SDK method on the shared client in the "garmin" thread pool."""
+    return await run_blocking("garmin", lambda: _garmin_call(get_garmin_client(), method, *args))
+
+# One long-lived client shared by all requests. It's created at startup (start_garmin),
+# logs in from the saved garth tokens once, and a background task keeps its OAuth2
+# session fresh; tokens are written back to TOKEN_DIR only when they change.
+GARMIN_SESSION_CHECK_SECONDS = float(os.getenv("GARMIN_SESSION_CHECK_SECONDS", "300"))
+GARMIN_SESSION_REFRESH_MARGIN_SECONDS = float(os.getenv("GARMIN_SESSION_REFRESH_MARGIN_SECONDS", "900"))
+
+_client: Optional[Garmin] = None
+_client_lock = threading.Lock()  # Guards login, session refresh and token writes
+_saved_tokens: Optional[str] = None  # garth.dumps() as last written to / read from TOKEN_DIR
+_session_keeper: Optional[asyncio.Task] = None
+
+def _save_tokens(client: Garmin):
+    """Write garth tokens to TOKEN_DIR if they changed since the last write (call with _client_lock held)."""
+    global _saved_tokens
+    tokens = client.garth.dumps()
+    if tokens != _saved_tokens:
+        client.garth.dump(TOKEN_DIR)
+        _saved_tokens = tokens
+
+def _connect() -> Garmin:
+    """Log in from saved tokens, falling back to credentials (call with _client_lock held)."""
+    global _saved_tokens
+    client = _instrument(Garmin())
     
     # Try to load saved session first
     try:
-        client.garth.load(TOKEN_DIR)
+        with track_upstream("garmin", "login"):
+            client.login(TOKEN_DIR)
+        _saved_tokens = client.garth.dumps()
         return client
     except Exception as e:
         print(f"Failed to load saved session: {e}")
     
     # If loading session fails, try to login with credentials
-    try:
-        client = Garmin(GARMIN_EMAIL, GARMIN_PASSWORD)
+    if not GARMIN_EMAIL or not GARMIN_PASSWORD:
+        raise RuntimeError("no saved Garmin session and GARMIN_EMAIL/GARMIN_PASSWORD not set")
+    client = _instrument(Garmin(GARMIN_EMAIL, GARMIN_PASSWORD))
+    with track_upstream("garmin", "login"):
         client.login()
-        
-        # Save session for future use
-        client.garth.dump(TOKEN_DIR)
-        
+    
+    # Save session for future use
+    _save_tokens(client)
+    return client
+
+def get_garmin_client() -> Garmin:
+    """Get the shared authenticated Garmin client (logging in only if there isn't one yet)."""
+    global _client
+    client = _client
+    if client is not None:
         return client
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = _connect()
+            except Exception as e:
+                print(f"Failed to login with credentials: {e}")
+                raise HTTPException(status_code=401, detail=f"Failed to authenticate with Garmin. Please check your credentials and try again: {str(e)}")
+        return _client
+
+def reset_garmin_client():
+    """Drop the shared client (e.g. after a 401) so the next request logs in again."""
+    global _client
+    with _client_lock:
+        _client = None
+
+def _refresh_session():
+    """Refresh the OAuth2 token ahead of expiry and persist tokens if anything changed."""
+    with _client_lock:
+        client = _client
+        if client is None:
+            return
+        expires_at = getattr(client.garth.oauth2_token, "expires_at", 0)
+        if expires_at - time.time() < GARMIN_SESSION_REFRESH_MARGIN_SECONDS:
+            with track_upstream("garmin", "refresh_oauth2"):
+                client.garth.refresh_oauth2()
+        # Also catches refreshes garth did by itself during a request
+        _save_tokens(client)
+
+async def _keep_session_fresh():
+    while True:
+        await asyncio.sleep(GARMIN_SESSION_CHECK_SECONDS)
+        try:
+            await run_blocking("garmin", _refresh_session)
+        except Exception as e:
+            print(f"Garmin session refresh failed: {e}")
+
+async def start_garmin():
+    """Create the shared client and start the session keeper (called from main.lifespan)."""
+    global _session_keeper
+    try:
+        await run_blocking("garmin", get_garmin_client)
+        print("Garmin client ready")
     except Exception as e:
-        print(f"Failed to login with credentials: {e}")
-        raise HTTPException(status_code=401, detail=f"Failed to authenticate with Garmin. Please check your credentials and try again: {str(e)}")
+        print(f"Garmin not connected at startup: {getattr(e, 'detail', e)}")
+    if _session_keeper is None or _session_keeper.done():
+        _session_keeper = asyncio.create_task(_keep_session_fresh())
+
+async def stop_garmin():
+    global _session_keeper
+    if _session_keeper is not None:
+        _session_keeper.cancel()
+        try:
+            await _session_keeper
+        except asyncio.CancelledError:
+            pass
+        _session_keeper = None
+    if _client is not None:
+        try:
+            await run_blocking("garmin", _refresh_session)
+        except Exception as e:
+            print(f"Failed to save Garmin session: {e}")
+
+def _format_stats(row) -> dict:
+    # Helper to safely convert None to 0
+    def safe_value(val, default=0):
+        return val if val is not None else default
+    
+    distance_km = round(row.distance_meters / 1000, 2) if row.distance_meters is not None else 0
+    
+    return {
+        "steps": safe_value(row.steps),
+        "calories": safe_value(row.calories),
+        "distance_km": distance_km,
+        "active_minutes": safe_value(row.moderate_minutes) + safe_value(row.vigorous_minutes),
+        "floors": safe_value(row.floors),
+        "resting_hr": row.resting_hr,
+        "max_hr": row.max_hr,
+        "min_hr": row.min_hr
+    }
+
+def _garmin_error(e: Exception, what: str) -> HTTPException:
+    print(f"Error fetching Garmin {what}: {e}")
+    error_msg = str(e)
+    if "401" in error_msg or "Unauthorized" in error_msg:
+        return HTTPException(status_code=503, detail="Garmin authentication expired. Please re-authenticate by running: python backend/authenticate_garmin.py")
+    return HTTPException(status_code=500, detail=f"Garmin API error: {error_msg}")
 
 @router.get("/stats")
+@cached("garmin", daily=True)
 async def get_stats():
     """Get today's activity stats."""
-    cache_key = f"stats_{date.today().isoformat()}"
-    
-    # Check cache first
-    cached_data = get_cached(cache_key)
-    if cached_data:
-        return cached_data
-    
     try:
-        client = get_garmin_client()
-        
-        # Get today's stats
-        stats = client.get_stats(date.today().isoformat())
-        
-        print(f"Garmin stats response: {stats}")
-        
-        # Helper to safely convert None to 0
-        def safe_value(val, default=0):
-            return val if val is not None else default
-        
-        total_distance = stats.get("totalDistanceMeters")
-        distance_km = round(total_distance / 1000, 2) if total_distance is not None else 0
-        
-        moderate_mins = safe_value(stats.get("moderateIntensityMinutes"))
-        vigorous_mins = safe_value(stats.get("vigorousIntensityMinutes"))
-        
-        result = {
-            "steps": safe_value(stats.get("totalSteps")),
-            "calories": safe_value(stats.get("totalKilocalories")),
-            "distance_km": distance_km,
-            "active_minutes": moderate_mins + vigorous_mins,
-            "floors": safe_value(stats.get("floorsAscended")),
-            "resting_hr": stats.get("restingHeartRate"),
-            "max_hr": stats.get("maxHeartRate"),
-            "min_hr": stats.get("minHeartRate")
-        }
-        
-        # Cache the result
-        set_cache(cache_key, result)
-        return result
+        today = date.today()
+        rows = await garmin_sync.daily_rows(_garmin, garmin_sync.STATS, today, today)
+        if not rows:
+            raise HTTPException(status_code=502, detail="Garmin returned no stats for today")
+        return _format_stats(rows[0])
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error fetching Garmin stats: {e}")
         import traceback
         traceback.print_exc()
-        error_msg = str(e)
-        if "401" in error_msg or "Unauthorized" in error_msg:
-            raise HTTPException(status_code=503, detail="Garmin authentication expired. Please re-authenticate by running: python backend/authenticate_garmin.py")
-        raise HTTPException(status_code=500, detail=f"Garmin API error: {error_msg}")
+        raise _garmin_error(e, "stats")
+
+@router.get("/stats/history")
+@cached("garmin", daily=True)
+async def get_stats_history(days: int = Query(7, ge=1, le=3650)):
+    """Daily stats for the last `days` days, newest first (served from the local store)."""
+    try:
+        today = date.today()
+        rows = await garmin_sync.daily_rows(_garmin, garmin_sync.STATS, today - timedelta(days=days - 1), today)
+        return [{"date": row.day.isoformat(), **_format_stats(row)} for row in rows]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _garmin_error(e, "stats history")
 
 @router.get("/sleep")
-async def get_sleep(days: int = 7):
-    """Get recent sleep data."""
-    cache_key = f"sleep_{days}_{date.today().isoformat()}"
-    
-    # Check cache first
-    cached_data = get_cached(cache_key)
-    if cached_data:
-        return cached_data
-    
+@cached("garmin", daily=True)
+async def get_sleep(days: int = Query(7, ge=1, le=3650)):
+    """Get recent sleep data (served from the local store)."""
     try:
-        client = get_garmin_client()
+        today = date.today()
+        rows = await garmin_sync.daily_rows(_garmin, garmin_sync.SLEEP, today - timedelta(days=days - 1), today)
         
-        sleep_history = []
-        for i in range(days):
-            check_date = date.today() - timedelta(days=i)
-            try:
-                sleep_data = client.get_sleep_data(check_date.isoformat())
-                daily_sleep = sleep_data.get("dailySleepDTO", {})
-                
-                if daily_sleep.get("sleepTimeSeconds", 0) > 0:
-                    sleep_history.append({
-                        "date": check_date.isoformat(),
-                        "total_sleep_seconds": daily_sleep.get("sleepTimeSeconds", 0),
-                        "deep_sleep_seconds": daily_sleep.get("deepSleepSeconds", 0),
-                        "light_sleep_seconds": daily_sleep.get("lightSleepSeconds", 0),
-                        "rem_sleep_seconds": daily_sleep.get("remSleepSeconds", 0),
-                        "awake_seconds": daily_sleep.get("awakeSleepSeconds", 0),
-                        "sleep_score": daily_sleep.get("sleepScores", {}).get("overall", {}).get("value"),
-                        "sleep_start": daily_sleep.get("sleepStartTimestampLocal"),
-                        "sleep_end": daily_sleep.get("sleepEndTimestampLocal")
-                    })
-            except:
-                continue
-        
-        # Cache the result
-        set_cache(cache_key, sleep_history)
-        return sleep_history
+        return [
+            {
+                "date": row.day.isoformat(),
+                "total_sleep_seconds": row.sleep_seconds,
+                "deep_sleep_seconds": row.deep_seconds or 0,
+                "light_sleep_seconds": row.light_seconds or 0,
+                "rem_sleep_seconds": row.rem_seconds or 0,
+                "awake_seconds": row.awake_seconds or 0,
+                "sleep_score": row.score,
+                "sleep_start": row.sleep_start,
+                "sleep_end": row.sleep_end
+            }
+            for row in rows if row.sleep_seconds > 0
+        ]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/activities")
-async def get_recent_activities(limit: int = 5):
+@cached("garmin", daily=True)
+async def get_recent_activities(limit: int = Query(5, ge=1, le=garmin_sync.GARMIN_SYNC_MAX_ACTIVITIES)):
     """Get recent activities."""
-    cache_key = f"activities_{limit}_{date.today().isoformat()}"
-    
-    # Check cache first
-    cached_data = get_cached(cache_key)
-    if cached_data:
-        return cached_data
-    
     try:
-        client = get_garmin_client()
-        
-        activities = client.get_activities(0, limit)
+        activities = await garmin_sync.recent_activities(_garmin, limit)
         
         result = []
         for activity in activities:
             result.append({
-                "id": activity.get("activityId"),
-                "name": activity.get("activityName"),
-                "type": activity.get("activityType", {}).get("typeKey"),
-                "start_time": activity.get("startTimeLocal"),
-                "duration_seconds": activity.get("duration"),
-                "distance_km": round(activity.get("distance", 0) / 1000, 2) if activity.get("distance") else None,
-                "calories": activity.get("calories"),
-                "avg_hr": activity.get("averageHR"),
-                "max_hr": activity.get("maxHR")
+                "id": activity.activity_id,
+                "name": activity.name,
+                "type": activity.type,
+                "start_time": activity.start_time_local,
+                "duration_seconds": activity.duration_seconds,
+                "distance_km": round(activity.distance_meters / 1000, 2) if activity.distance_meters else None,
+                "calories": activity.calories,
+                "avg_hr": activity.avg_hr,
+                "max_hr": activity.max_hr
             })
         
-        # Cache the result
-        set_cache(cache_key, result)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/activities/{activity_id}/track")
+async def get_activity_track(
+    activity_id: int,
+    detail: Literal["full", "high", "medium", "low"] = "medium",
+    encoded: bool = True,
+):
+    """GPS track of an activity, simplified for the given detail level (served from the local store).
+    
+    Returns an encoded polyline, or [[lat, lon], ...] with encoded=false.
+    """
+    try:
+        track = await garmin_sync.get_track(_garmin, activity_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _garmin_error(e, "activity track")
+    if not track.points:
+        raise HTTPException(status_code=404, detail="Activity has no GPS track")
+    
+    level = json.loads(track.levels)[detail]
+    result = {
+        "activity_id": activity_id,
+        "detail": detail,
+        "points": level["points"],
+        "recorded_points": track.points,
+        "bounds": [[track.min_lat, track.min_lon], [track.max_lat, track.max_lon]],
+    }
+    if encoded:
+        result["polyline"] = level["polyline"]
+    else:
+        result["coordinates"] = decode_polyline(level["polyline"])
+    return result
+
 @router.get("/heart-rate")
 async def get_heart_rate():
     """Get current heart rate data."""
     try:
-        client = get_garmin_client()
-        
-        hr_data = client.get_heart_rates(date.today().isoformat())
+        hr_data = await _garmin("get_heart_rates", date.today().isoformat())
         
         # Get latest heart rate reading
         heart_rate_values = hr_data.get("heartRateValues", [])
@@ -217,58 +339,103 @@ async def get_heart_rate():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Raw intraday series are cached per day; closed days don't change
+HEART_RATE_OPEN_DAY_TTL = float(os.getenv("GARMIN_HEART_RATE_TTL_SECONDS", "300"))
+HEART_RATE_CLOSED_DAY_TTL = 24 * 60 * 60
+MAX_HEART_RATE_POINTS = 2000
+
+async def _intraday_heart_rate(day: date) -> dict:
+    """get_heart_rates for one day as numpy arrays, cached per day."""
+    hit, series = cache.get("garmin_hr", day)
+    if hit:
+        return series
+    
+    async def fetch():
+        hr_data = await _garmin("get_heart_rates", day.isoformat())
+        values = [v for v in (hr_data.get("heartRateValues") or []) if v and v[1] is not None]
+        values.sort(key=lambda v: v[0])
+        return {
+            "timestamps": np.array([v[0] for v in values], dtype=np.int64),
+            "bpm": np.array([v[1] for v in values], dtype=np.int64),
+            "resting": hr_data.get("restingHeartRate"),
+            "max": hr_data.get("maxHeartRate"),
+            "min": hr_data.get("minHeartRate"),
+        }
+    
+    series = await group.do(("garmin_hr", day), fetch)
+    open_day = day >= date.today() - timedelta(days=1)
+    cache.set("garmin_hr", day, series, ttl=HEART_RATE_OPEN_DAY_TTL if open_day else HEART_RATE_CLOSED_DAY_TTL)
+    return series
+
+@router.get("/heart-rate/intraday")
+async def get_intraday_heart_rate(
+    day: Optional[date] = None,
+    points: int = Query(300, ge=3, le=MAX_HEART_RATE_POINTS),
+):
+    """Intraday heart rate for a day (default today), downsampled with LTTB to at most `points` [timestamp_ms, bpm] pairs."""
+    day = day or date.today()
+    try:
+        series = await _intraday_heart_rate(day)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _garmin_error(e, "heart rate")
+    
+    timestamps, bpm = series["timestamps"], series["bpm"]
+    keep = lttb(timestamps, bpm, points)
+    return {
+        "date": day.isoformat(),
+        "raw_points": len(timestamps),
+        "resting": series["resting"],
+        "max": series["max"],
+        "min": series["min"],
+        "values": np.column_stack((timestamps[keep], bpm[keep])).tolist(),
+    }
+
 @router.get("/body")
+@cached("garmin", daily=True)
 async def get_body_metrics():
     """Get body metrics (weight, body battery, stress)."""
-    cache_key = f"body_{date.today().isoformat()}"
-    
-    # Check cache first
-    cached_data = get_cached(cache_key)
-    if cached_data:
-        return cached_data
-    
     try:
-        client = get_garmin_client()
-        
-        # Get body composition
-        try:
-            body_comp = client.get_body_composition(date.today().isoformat())
-            weight = body_comp.get("weight")
-        except:
-            weight = None
-        
-        # Get stress data
-        try:
-            stress_data = client.get_stress_data(date.today().isoformat())
-            avg_stress = stress_data.get("avgStressLevel")
-            max_stress = stress_data.get("maxStressLevel")
-        except:
-            avg_stress = None
-            max_stress = None
+        today = date.today()
+        body_rows, stats_rows = await asyncio.gather(
+            garmin_sync.daily_rows(_garmin, garmin_sync.BODY, today, today),
+            garmin_sync.daily_rows(_garmin, garmin_sync.STATS, today, today),
+        )
+        weight = body_rows[0].weight_grams if body_rows else None
+        stats = stats_rows[0] if stats_rows else None
         
         result = {
             "weight_kg": weight / 1000 if weight else None,  # Convert grams to kg
-            "avg_stress": avg_stress,
-            "max_stress": max_stress
+            "avg_stress": stats.avg_stress if stats else None,
+            "max_stress": stats.max_stress if stats else None
         }
         
-        # Cache the result
-        set_cache(cache_key, result)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/sync")
+async def sync_garmin(days: int = Query(7, ge=1, le=90), user: User = Depends(require_user)):
+    """Refetch the last `days` days and the newest activities into the local store.
+
+    Longer history is for backend/backfill_garmin.py, which rate-limits and checkpoints.
+    """
+    try:
+        stored = await garmin_sync.sync_recent(_garmin, days)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _garmin_error(e, "sync")
+    cache.invalidate("garmin")
+    return {"status": "ok", "stored": stored}
+
 @router.get("/status")
 async def get_status():
     """Check if Garmin authentication is working."""
     try:
-        # Try to load saved session
-        client = Garmin()
-        client.garth.load(TOKEN_DIR)
-        
         # Try a simple API call to verify
-        from datetime import date
-        stats = client.get_stats(date.today().isoformat())
+        stats = await _garmin("get_stats", date.today().isoformat())
         
         return {
             "authenticated": True,
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Query, Response
 from fastapi.responses import RedirectResponse
 import os
 from google.auth.transport.requests import Request as GoogleRequest
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+import asyncio
 import datetime
+import json
+from typing import Annotated, Optional
 from sqlmodel import Session, select
 from backend.database import get_session, get_sync_session
-from backend.models import User, UserToken
-from backend.auth import get_current_user, require_user, create_access_token, set_auth_cookie
+from backend.models import CalendarEvent, EmailMessage, User, UserToken
+from backend.auth import get_current_user, require_user, create_access_token, set_auth_cookie, invalidate_principal
+from backend import google_sync
+from backend.executors import run_blocking
+from backend.google_api import authorized_http, execute, get_service
+from backend.metrics import track_upstream
+from backend.tokens import tokens
 
 router = APIRouter()
 
@@ -41,7 +48,12 @@ SCOPES = [
     'https://www.googleapis.com/auth/gmail.readonly',
     'https://www.googleapis.com/auth/calendar.events.readonly'
 ]
+
+# Inbox preview size (override per request with ?max_emails=)
+EMAIL_PREVIEW_SIZE = int(os.getenv('GMAIL_PREVIEW_SIZE', '3'))
+MAX_EMAIL_PREVIEW = 50
 # ---------------------
+
 @router.get("/login")
 async def google_login():
     """Initiate Google OAuth flow"""
@@ -65,6 +77,17 @@ async def google_login():
     )
     return {"auth_url": auth_url}
 
+def _fetch_token(flow: Flow, code: str):
+    # Suppress scope mismatch warnings
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        with track_upstream("google", "oauth2.token.exchange"):
+            flow.fetch_token(code=code)
+
+def _fetch_user_info(creds: Credentials) -> dict:
+    return execute(get_service('oauth2', 'v2').userinfo().get(), authorized_http(creds))
+
 @router.get("/callback")
 async def google_callback(
     code: str,
@@ -82,18 +105,13 @@ async def google_callback(
             redirect_uri=redirect_uri,
             state=state,
         )
-        # Suppress scope mismatch warnings
-        import warnings
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            flow.fetch_token(code=code)
+        await run_blocking("google", _fetch_token, flow, code)
         creds = flow.credentials
         print(f"🔵 Token fetched successfully")
         print(f"🔵 Token: {creds.token[:20]}...")
         
         # Get user info from Google using the credentials
-        user_info_service = build('oauth2', 'v2', credentials=creds, static_discovery=False)
-        user_info = user_info_service.userinfo().get().execute()
+        user_info = await run_blocking("google", _fetch_user_info, creds)
         print(f"🔵 User info: {user_info.get('email')}")
     except Exception as e:
         print(f"❌ ERROR in callback: {e}")
@@ -138,6 +156,7 @@ async def google_callback(
 
     session.commit()
     session.refresh(user)
+    invalidate_principal(user_id=user.id)  # Profile may have changed
     print(f"🔵 User ID: {user.id}")
     
     # Store Google tokens
@@ -169,6 +188,7 @@ async def google_callback(
         session.add(user_token)
     
     session.commit()
+    tokens.invalidate(user.id, "google")
     
     # Create JWT token for our app
     access_token = create_access_token(user.id, user.email)
@@ -181,41 +201,104 @@ async def google_callback(
     
     return redirect_response
 
-async def get_user_google_creds(user: User, session: Session):
-    """Get Google credentials for a specific user"""
-    statement = select(UserToken).where(
-        UserToken.user_id == user.id,
-        UserToken.service == "google"
-    )
-    token = (await session.exec(statement)).first()
-    
-    if not token:
-        return None
-    
-    creds = Credentials(
+def _client_config() -> dict:
+    """OAuth client id/secret from credentials.json (needed to refresh tokens)."""
+    try:
+        with open(CREDENTIALS_FILE) as f:
+            config = json.load(f)
+        config = config.get("web") or config.get("installed") or {}
+        return {"client_id": config.get("client_id"), "client_secret": config.get("client_secret")}
+    except (OSError, ValueError):
+        return {"client_id": None, "client_secret": None}
+
+def _credentials(token: UserToken) -> Credentials:
+    return Credentials(
         token=token.access_token,
         refresh_token=token.refresh_token,
         token_uri="https://oauth2.googleapis.com/token",
-        client_id=None,  # Not needed for API calls
-        client_secret=None,  # Not needed for API calls
-        scopes=token.scope.split(" ") if token.scope else SCOPES
+        scopes=token.scope.split(" ") if token.scope else SCOPES,
+        **_client_config()
     )
-    
-    # Refresh if expired
-    if creds.expired and creds.refresh_token:
+
+def _refresh_credentials(creds: Credentials):
+    with track_upstream("google", "oauth2.token.refresh"):
         creds.refresh(GoogleRequest())
-        # Update stored token
-        token.access_token = creds.token
-        if creds.expiry:
-            token.expires_at = creds.expiry
-        token.updated_at = datetime.datetime.utcnow()
-        session.add(token)
-        session.commit()
+
+async def refresh_google_token(token: UserToken) -> Optional[dict]:
+    """Refresh a Google access token (called by the token manager; the SDK call is blocking)."""
+    creds = _credentials(token)
+    await run_blocking("google", _refresh_credentials, creds)
+    return {"access_token": creds.token, "expires_at": creds.expiry}
+
+# Google reports expiry as naive UTC
+tokens.register("google", refresh_google_token, utc_expiry=True)
+
+async def get_user_google_creds(user: User, session: Session):
+    """Get Google credentials for a specific user, refreshed if about to expire"""
+    token = await tokens.get_valid(user.id, "google")
+    if not token:
+        return None
+    return _credentials(token)
+
+def _format_email(message: EmailMessage) -> dict:
+    sender = message.sender
+    # Simplified sender name (e.g., "Amazon <noreply@amazon.com>" -> "Amazon")
+    if "<" in sender: sender = sender.split("<")[0].strip().replace('"', '')
+    return {
+        "from": sender,
+        "subject": message.subject,
+        "time": "recent",
+        "important": False,
+        "unread": ",UNREAD," in message.labels,
+        "id": message.message_id
+    }
+
+async def _inbox(user: User, creds: Credentials, session, limit: int, label: Optional[str] = "INBOX",
+                 unread: Optional[bool] = None, synced: bool = False) -> list:
+    """Newest messages from the local header index (synced incrementally from Gmail)"""
+    if not synced:
+        await google_sync.ensure_gmail_synced(user.id, creds)
+    messages = await google_sync.email_messages(session, user.id, limit, label=label, unread=unread)
+    return [_format_email(message) for message in messages]
+
+def _format_event(event: CalendarEvent) -> dict:
+    start = event.start_local
+    
+    # Parse the date/datetime
+    if not event.all_day:
+        # Has time component
+        event_dt = datetime.datetime.fromisoformat(start.replace('Z', '+00:00'))
+        time_str = event_dt.strftime('%H:%M')
+        date_str = event_dt.strftime('%Y-%m-%d')
+        day_name = event_dt.strftime('%A')
+    else:
+        # All-day event
+        event_dt = datetime.datetime.fromisoformat(start)
+        time_str = 'All day'
+        date_str = start
+        day_name = event_dt.strftime('%A')
     
-    return creds
+    return {
+        "id": event.event_id, 
+        "title": event.title, 
+        "time": time_str,
+        "date": date_str,
+        "day": day_name,
+        "type": "personal"
+    }
+
+async def _calendar_window(user: User, creds: Credentials, session, start: datetime.datetime, days: int,
+                           synced: bool = False) -> list:
+    """Events from the local copy (synced incrementally from Google)"""
+    if not synced:
+        await google_sync.ensure_calendar_synced(user.id, creds)
+    events = await google_sync.calendar_events(session, user.id, start, start + datetime.timedelta(days=days))
+    return [_format_event(event) for event in events]
 
 @router.get("/data")
 async def get_google_data(
+    # Annotated so direct calls (the dashboard) get None rather than the Query object
+    max_emails: Annotated[Optional[int], Query(ge=1, le=MAX_EMAIL_PREVIEW)] = None,
     user: User = Depends(require_user),
     session: Session = Depends(get_session)
 ):
@@ -224,58 +307,57 @@ async def get_google_data(
     if not creds:
         return {"authenticated": False, "error": "Google account not connected"}
 
-    # 1. GMAIL
-    gmail = build('gmail', 'v1', credentials=creds)
-    results = gmail.users().messages().list(userId='me', labelIds=['INBOX'], maxResults=3).execute()
-    email_data = []
-    for msg in results.get('messages', []):
-        txt = gmail.users().messages().get(userId='me', id=msg['id']).execute()
-        headers = txt['payload']['headers']
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject")
-        sender = next((h['value'] for h in headers if h['name'] == 'From'), "Unknown")
-        # Simplified sender name (e.g., "Amazon <noreply@amazon.com>" -> "Amazon")
-        if "<" in sender: sender = sender.split("<")[0].strip().replace('"', '')
-        email_data.append({"from": sender, "subject": subject, "time": "recent", "important": False, "id": msg['id']})
+    # Only a first-time sync waits on Google; run those concurrently. The reads then go
+    # one after the other, since an AsyncSession can't run two queries at once.
+    await asyncio.gather(
+        google_sync.ensure_gmail_synced(user.id, creds),
+        google_sync.ensure_calendar_synced(user.id, creds),
+    )
+    email_data = await _inbox(user, creds, session, max_emails or EMAIL_PREVIEW_SIZE, synced=True)
+    calendar_data = await _calendar_window(user, creds, session, datetime.datetime.utcnow(), 7, synced=True)
 
-    # 2. CALENDAR - Get next 7 days of events
-    calendar = build('calendar', 'v3', credentials=creds)
-    now = datetime.datetime.utcnow()
-    time_min = now.isoformat() + 'Z'
-    time_max = (now + datetime.timedelta(days=7)).isoformat() + 'Z'
-    
-    events = calendar.events().list(
-        calendarId='primary', 
-        timeMin=time_min,
-        timeMax=time_max,
-        singleEvents=True, 
-        orderBy='startTime'
-    ).execute()
-    
-    calendar_data = []
-    for event in events.get('items', []):
-        start = event['start'].get('dateTime', event['start'].get('date'))
-        
-        # Parse the date/datetime
-        if 'T' in start:
-            # Has time component
-            event_dt = datetime.datetime.fromisoformat(start.replace('Z', '+00:00'))
-            time_str = event_dt.strftime('%H:%M')
-            date_str = event_dt.strftime('%Y-%m-%d')
-            day_name = event_dt.strftime('%A')
-        else:
-            # All-day event
-            event_dt = datetime.datetime.fromisoformat(start)
-            time_str = 'All day'
-            date_str = start
-            day_name = event_dt.strftime('%A')
-        
-        calendar_data.append({
-            "id": event['id'], 
-            "title": event['summary'], 
-            "time": time_str,
-            "date": date_str,
-            "day": day_name,
-            "type": "personal"
-        })
+    return {"authenticated": True, "emails": email_data, "calendar": calendar_data}
+
+@router.get("/calendar")
+async def get_calendar(
+    start: Optional[datetime.date] = None,
+    days: int = Query(default=7, ge=1, le=366),
+    user: User = Depends(require_user),
+    session: Session = Depends(get_session)
+):
+    """Calendar events for any window (default: next 7 days), served from the local event store"""
+    creds = await get_user_google_creds(user, session)
+    if not creds:
+        return {"authenticated": False, "error": "Google account not connected"}
+    window_start = datetime.datetime.combine(start, datetime.time()) if start else datetime.datetime.utcnow()
+    return {"authenticated": True, "calendar": await _calendar_window(user, creds, session, window_start, days)}
 
-    return {"authenticated": True, "emails": email_data, "calendar": calendar_data}
\ No newline at end of file
+@router.get("/emails")
+async def get_emails(
+    limit: int = Query(default=20, ge=1, le=200),
+    label: Optional[str] = "INBOX",
+    unread: Optional[bool] = None,
+    user: User = Depends(require_user),
+    session: Session = Depends(get_session)
+):
+    """Newest messages from the local Gmail index, filtered by label (e.g. INBOX, STARRED) and unread state"""
+    creds = await get_user_google_creds(user, session)
+    if not creds:
+        return {"authenticated": False, "error": "Google account not connected"}
+    return {"authenticated": True, "emails": await _inbox(user, creds, session, limit, label=label or None, unread=unread)}
+
+@router.post("/sync")
+async def sync_google(
+    full: bool = False,
+    user: User = Depends(require_user),
+    session: Session = Depends(get_session)
+):
+    """Pull Google changes into the local stores now (full=true drops the sync cursors and resyncs)"""
+    creds = await get_user_google_creds(user, session)
+    if not creds:
+        return {"authenticated": False, "error": "Google account not connected"}
+    calendar_changes, gmail_changes = await asyncio.gather(
+        google_sync.sync_calendar(user.id, creds, full=full),
+        google_sync.sync_gmail(user.id, creds, full=full),
+    )
+    return {"authenticated": True, "calendar_changes": calendar_changes, "gmail_changes": gmail_changes}
\ No newline at end of file
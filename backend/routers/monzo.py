@@ -1,94 +1,117 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import RedirectResponse
+import asyncio
 import httpx
+import json
 import os
 import secrets as _secrets
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional
+from backend.auth import require_user
+from backend.http_clients import get_client, http_client
+from backend.models import User, UserToken
+from backend.tokens import tokens
+from backend.singleflight import coalesced_get
 
 router = APIRouter()
 
-# Pending OAuth state (single-user; stores the random state between /auth and /callback)
-_pending_oauth_state: Optional[str] = None
+# Pending OAuth states: random state from /auth -> id of the user who started the flow
+_pending_oauth_states: Dict[str, int] = {}
 
 # Monzo OAuth credentials
 MONZO_CLIENT_ID = os.getenv("MONZO_CLIENT_ID")
 MONZO_CLIENT_SECRET = os.getenv("MONZO_CLIENT_SECRET")
 REDIRECT_URI = os.getenv("MONZO_REDIRECT_URI", "http://localhost:8080/api/monzo/callback")
 
-# Token storage file
+# Legacy token file (tokens now live in UserToken; imported once if present)
 TOKEN_FILE = "monzo_tokens.json"
 
-def load_tokens():
-    """Load tokens from file"""
-    access_token_env = os.getenv("MONZO_ACCESS_TOKEN")
-    if access_token_env and access_token_env.strip():
-        return {
-            "access_token": access_token_env,
-            "refresh_token": None,
-            "expires_at": None
-        }
-    
+def _read_legacy_tokens() -> Optional[dict]:
+    """Tokens from the old monzo_tokens.json, if it exists"""
     try:
-        import json
         if os.path.exists(TOKEN_FILE):
             with open(TOKEN_FILE, 'r') as f:
                 data = json.load(f)
-                # Convert expires_at string back to datetime
-                if data.get("expires_at"):
-                    data["expires_at"] = datetime.fromisoformat(data["expires_at"])
-                return data
+            if data.get("expires_at"):
+                data["expires_at"] = datetime.fromisoformat(data["expires_at"])
+            return data if data.get("access_token") else None
     except Exception as e:
         print(f"Error loading tokens: {e}")
+    return None
+
+async def get_monzo_token(user: User) -> Optional[UserToken]:
+    """The user's Monzo token (cached in memory by the token manager)"""
+    access_token_env = os.getenv("MONZO_ACCESS_TOKEN")
+    if access_token_env and access_token_env.strip():
+        # Manual override, never stored or refreshed
+        return UserToken(user_id=user.id, service="monzo", access_token=access_token_env.strip())
     
+    token = await tokens.get(user.id, "monzo")
+    if token is None:
+        legacy = await asyncio.to_thread(_read_legacy_tokens)
+        if legacy:
+            token = await tokens.store(
+                user.id, "monzo",
+                access_token=legacy["access_token"],
+                refresh_token=legacy.get("refresh_token"),
+                expires_at=legacy.get("expires_at")
+            )
+            try:
+                os.replace(TOKEN_FILE, TOKEN_FILE + ".migrated")
+                print(f"Imported {TOKEN_FILE} into the database for {user.email}")
+            except OSError:
+                pass  # A concurrent request already moved it
+    return token
+
+async def refresh_monzo_token(token: UserToken) -> Optional[dict]:
+    """Refresh the Monzo access token (called by the token manager; refresh tokens are single-use)"""
+    client = get_client("monzo")
+    response = await client.post(
+        "https://api.monzo.com/oauth2/token",
+        data={
+            "grant_type": "refresh_token",
+            "client_id": MONZO_CLIENT_ID,
+            "client_secret": MONZO_CLIENT_SECRET,
+            "refresh_token": token.refresh_token
+        }
+    )
+    if response.status_code != 200:
+        print(f"Error refreshing Monzo token: {response.status_code}")
+        return None
+    token_data = response.json()
     return {
-        "access_token": None,
-        "refresh_token": None,
-        "expires_at": None
+        "access_token": token_data["access_token"],
+        "refresh_token": token_data["refresh_token"],
+        "expires_at": datetime.now() + timedelta(seconds=token_data["expires_in"])
     }
 
-def save_tokens(tokens):
-    """Save tokens to file"""
-    try:
-        import json
-        data = tokens.copy()
-        # Convert datetime to string for JSON serialization
-        if data.get("expires_at"):
-            data["expires_at"] = data["expires_at"].isoformat()
-        with open(TOKEN_FILE, 'w') as f:
-            json.dump(data, f)
-    except Exception as e:
-        print(f"Error saving tokens: {e}")
-
-# Token storage (persisted to file)
-monzo_tokens = load_tokens()
+tokens.register("monzo", refresh_monzo_token)
 
 @router.get("/auth")
-async def monzo_auth():
+async def monzo_auth(user: User = Depends(require_user)):
     """Redirect to Monzo OAuth login"""
-    global _pending_oauth_state
     if not MONZO_CLIENT_ID:
         raise HTTPException(
             status_code=500,
             detail="Monzo API not configured. Add MONZO_CLIENT_ID to .env"
         )
 
-    _pending_oauth_state = _secrets.token_urlsafe(16)
+    state = _secrets.token_urlsafe(16)
+    _pending_oauth_states[state] = user.id
     auth_url = (
         f"https://auth.monzo.com/?client_id={MONZO_CLIENT_ID}"
         f"&redirect_uri={REDIRECT_URI}"
         f"&response_type=code"
-        f"&state={_pending_oauth_state}"
+        f"&state={state}"
     )
     return RedirectResponse(auth_url)
 
 @router.get("/callback")
-async def monzo_callback(code: str, state: str):
+async def monzo_callback(code: str, state: str, client: httpx.AsyncClient = Depends(http_client("monzo"))):
     """Handle OAuth callback from Monzo"""
-    global _pending_oauth_state
-    if _pending_oauth_state is None or not _secrets.compare_digest(state, _pending_oauth_state):
+    user_id = _pending_oauth_states.pop(state, None)  # Consume state — one-time use
+    if user_id is None:
         raise HTTPException(status_code=400, detail="Invalid OAuth state parameter")
-    _pending_oauth_state = None  # Consume state — one-time use
 
     try:
         if not MONZO_CLIENT_ID or not MONZO_CLIENT_SECRET:
@@ -101,91 +124,90 @@ async def monzo_callback(code: str, state: str):
         print(f"Client ID: {MONZO_CLIENT_ID}")
         print(f"Redirect URI: {REDIRECT_URI}")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.monzo.com/oauth2/token",
-                data={
-                    "grant_type": "authorization_code",
-                    "client_id": MONZO_CLIENT_ID,
-                    "client_secret": MONZO_CLIENT_SECRET,
-                    "redirect_uri": REDIRECT_URI,
-                    "code": code
-                }
+        response = await client.post(
+            "https://api.monzo.com/oauth2/token",
+            data={
+                "grant_type": "authorization_code",
+                "client_id": MONZO_CLIENT_ID,
+                "client_secret": MONZO_CLIENT_SECRET,
+                "redirect_uri": REDIRECT_URI,
+                "code": code
+            }
+        )
+        
+        # Removed sensitive logging that could expose tokens
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail="Failed to get access token from Monzo API"
             )
-            
-            # Removed sensitive logging that could expose tokens
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="Failed to get access token from Monzo API"
-                )
-            
-            token_data = response.json()
-            monzo_tokens["access_token"] = token_data["access_token"]
-            monzo_tokens["refresh_token"] = token_data["refresh_token"]
-            monzo_tokens["expires_at"] = datetime.now() + timedelta(seconds=token_data["expires_in"])
-            
-            # Save tokens to file
-            save_tokens(monzo_tokens)
-            
-            print("Successfully stored Monzo tokens!")
-            
-            # Return HTML page that shows success and instructs to approve in app
-            html_content = """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>Monzo Connected</title>
-                <style>
-                    body {
-                        font-family: monospace;
-                        background: #1a1d21;
-                        color: #d1d0c5;
-                        display: flex;
-                        justify-content: center;
-                        align-items: center;
-                        height: 100vh;
-                        margin: 0;
-                    }
-                    .container {
-                        text-align: center;
-                        padding: 2rem;
-                        background: #323437;
-                        border-radius: 8px;
-                        max-width: 500px;
-                    }
-                    h1 { color: #e2b714; margin-bottom: 1rem; }
-                    p { line-height: 1.6; }
-                    .emoji { font-size: 3rem; margin-bottom: 1rem; }
-                    button {
-                        background: #e2b714;
-                        color: #1a1d21;
-                        border: none;
-                        padding: 0.75rem 1.5rem;
-                        border-radius: 4px;
-                        font-family: monospace;
-                        font-weight: bold;
-                        cursor: pointer;
-                        margin-top: 1rem;
-                    }
-                    button:hover { opacity: 0.8; }
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="emoji">🎉</div>
-                    <h1>Monzo Connected!</h1>
-                    <p><strong>Important:</strong> Check your Monzo app now.</p>
-                    <p>You should see a notification asking you to approve access with your PIN or fingerprint.</p>
-                    <p>Once approved, your balance and spending data will appear in the dashboard.</p>
-                    <button onclick="window.close()">Close this tab</button>
-                </div>
-            </body>
-            </html>
-            """
-            from fastapi.responses import HTMLResponse
-            return HTMLResponse(content=html_content)
+        
+        token_data = response.json()
+        await tokens.store(
+            user_id, "monzo",
+            access_token=token_data["access_token"],
+            refresh_token=token_data["refresh_token"],
+            expires_at=datetime.now() + timedelta(seconds=token_data["expires_in"])
+        )
+        
+        print("Successfully stored Monzo tokens!")
+        
+        # Return HTML page that shows success and instructs to approve in app
+        html_content = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>Monzo Connected</title>
+            <style>
+                body {
+                    font-family: monospace;
+                    background: #1a1d21;
+                    color: #d1d0c5;
+                    display: flex;
+                    justify-content: center;
+                    align-items: center;
+                    height: 100vh;
+                    margin: 0;
+                }
+                .container {
+                    text-align: center;
+                    padding: 2rem;
+                    background: #323437;
+                    border-radius: 8px;
+                    max-width: 500px;
+                }
+                h1 { color: #e2b714; margin-bottom: 1rem; }
+                p { line-height: 1.6; }
+                .emoji { font-size: 3rem; margin-bottom: 1rem; }
+                button {
+                    background: #e2b714;
+                    color: #1a1d21;
+                    border: none;
+                    padding: 0.75rem 1.5rem;
+                    border-radius: 4px;
+                    font-family: monospace;
+                    font-weight: bold;
+                    cursor: pointer;
+                    margin-top: 1rem;
+                }
+                button:hover { opacity: 0.8; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="emoji">🎉</div>
+                <h1>Monzo Connected!</h1>
+                <p><strong>Important:</strong> Check your Monzo app now.</p>
+                <p>You should see a notification asking you to approve access with your PIN or fingerprint.</p>
+                <p>Once approved, your balance and spending data will appear in the dashboard.</p>
+                <button onclick="window.close()">Close this tab</button>
+            </div>
+        </body>
+        </html>
+        """
+        from fastapi.responses import HTMLResponse
+        return HTMLResponse(content=html_content)
     except Exception as e:
         print(f"Error in Monzo callback: {str(e)}")
         import traceback
@@ -245,265 +267,238 @@ async def monzo_callback(code: str, state: str):
         from fastapi.responses import HTMLResponse
         return HTMLResponse(content=error_html, status_code=500)
 
-async def get_valid_token():
+async def get_valid_token(user: User):
     """Get a valid access token, refreshing if necessary"""
-    if not monzo_tokens["access_token"]:
+    token = await get_monzo_token(user)
+    if not token or not token.access_token:
         raise HTTPException(
             status_code=401,
             detail="Not connected to Monzo. Please authenticate first."
         )
     
-    # Check if token is expired
-    if monzo_tokens["expires_at"] and datetime.now() >= monzo_tokens["expires_at"]:
-        # Refresh the token
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.monzo.com/oauth2/token",
-                data={
-                    "grant_type": "refresh_token",
-                    "client_id": MONZO_CLIENT_ID,
-                    "client_secret": MONZO_CLIENT_SECRET,
-                    "refresh_token": monzo_tokens["refresh_token"]
-                }
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="Failed to refresh token"
-                )
-            
-            token_data = response.json()
-            monzo_tokens["access_token"] = token_data["access_token"]
-            monzo_tokens["refresh_token"] = token_data["refresh_token"]
-            monzo_tokens["expires_at"] = datetime.now() + timedelta(seconds=token_data["expires_in"])
-            
-            # Save refreshed tokens
-            save_tokens(monzo_tokens)
+    if not token.refresh_token:
+        return token.access_token  # Manual tokens don't auto-refresh
     
-    return monzo_tokens["access_token"]
+    access_token = await tokens.get_valid_token(user.id, "monzo")
+    if not access_token:
+        raise HTTPException(
+            status_code=401,
+            detail="Failed to refresh token"
+        )
+    return access_token
 
 @router.get("/whoami")
-async def whoami():
+async def whoami(user: User = Depends(require_user), client: httpx.AsyncClient = Depends(http_client("monzo"))):
     """Check token validity and get user info"""
-    token = await get_valid_token()
+    token = await get_valid_token(user)
     
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://api.monzo.com/ping/whoami",
-            headers={"Authorization": f"Bearer {token}"}
+    response = await coalesced_get(client,
+        "https://api.monzo.com/ping/whoami",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Token validation failed: {response.text}"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Token validation failed: {response.text}"
-            )
-        
-        return response.json()
+    
+    return response.json()
 
 @router.get("/accounts")
-async def get_accounts():
+async def get_accounts(user: User = Depends(require_user), client: httpx.AsyncClient = Depends(http_client("monzo"))):
     """Get Monzo accounts"""
-    token = await get_valid_token()
+    token = await get_valid_token(user)
     
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://api.monzo.com/accounts",
-            headers={"Authorization": f"Bearer {token}"}
+    response = await coalesced_get(client,
+        "https://api.monzo.com/accounts",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to get accounts: {response.text}"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to get accounts: {response.text}"
-            )
-        
-        return response.json()
+    
+    return response.json()
 
 @router.get("/balance")
-async def get_balance(account_id: Optional[str] = None):
+async def get_balance(account_id: Optional[str] = None, user: User = Depends(require_user), client: httpx.AsyncClient = Depends(http_client("monzo"))):
     """Get account balance"""
-    token = await get_valid_token()
+    token = await get_valid_token(user)
     
     # If no account_id provided, get the first account
     if not account_id:
-        async with httpx.AsyncClient() as client:
-            accounts_response = await client.get(
-                "https://api.monzo.com/accounts",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            
-            if accounts_response.status_code != 200:
-                raise HTTPException(
-                    status_code=accounts_response.status_code,
-                    detail=f"Failed to get accounts: {accounts_response.text}"
-                )
-            
-            accounts_data = accounts_response.json()
-            print(f"Accounts response: {accounts_data}")  # Debug logging
-            
-            accounts = accounts_data.get("accounts", [])
-            if not accounts:
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"No accounts found. Response: {accounts_data}"
-                )
-            
-            # Filter for active accounts only
-            active_accounts = [acc for acc in accounts if not acc.get("closed", False)]
-            if not active_accounts:
-                raise HTTPException(
-                    status_code=404,
-                    detail="No active accounts found"
-                )
-            
-            account_id = active_accounts[0]["id"]
-            print(f"Using account_id: {account_id}")  # Debug logging
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"https://api.monzo.com/balance?account_id={account_id}",
+        accounts_response = await coalesced_get(client,
+            "https://api.monzo.com/accounts",
             headers={"Authorization": f"Bearer {token}"}
         )
         
-        if response.status_code != 200:
+        if accounts_response.status_code != 200:
             raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to get balance: {response.text}"
+                status_code=accounts_response.status_code,
+                detail=f"Failed to get accounts: {accounts_response.text}"
             )
         
-        balance_data = response.json()
-        return {
-            "balance": balance_data["balance"] / 100,  # Convert pence to pounds
-            "total_balance": balance_data["total_balance"] / 100,
-            "currency": balance_data["currency"],
-            "spend_today": balance_data.get("spend_today", 0) / 100
-        }
+        accounts_data = accounts_response.json()
+        print(f"Accounts response: {accounts_data}")  # Debug logging
+        
+        accounts = accounts_data.get("accounts", [])
+        if not accounts:
+            raise HTTPException(
+                status_code=404, 
+                detail=f"No accounts found. Response: {accounts_data}"
+            )
+        
+        # Filter for active accounts only
+        active_accounts = [acc for acc in accounts if not acc.get("closed", False)]
+        if not active_accounts:
+            raise HTTPException(
+                status_code=404,
+                detail="No active accounts found"
+            )
+        
+        account_id = active_accounts[0]["id"]
+        print(f"Using account_id: {account_id}")  # Debug logging
+    
+    response = await coalesced_get(client,
+        f"https://api.monzo.com/balance?account_id={account_id}",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to get balance: {response.text}"
+        )
+    
+    balance_data = response.json()
+    return {
+        "balance": balance_data["balance"] / 100,  # Convert pence to pounds
+        "total_balance": balance_data["total_balance"] / 100,
+        "currency": balance_data["currency"],
+        "spend_today": balance_data.get("spend_today", 0) / 100
+    }
 
 @router.get("/transactions")
-async def get_transactions(account_id: Optional[str] = None, days: int = 7):
+async def get_transactions(account_id: Optional[str] = None, days: int = 7, user: User = Depends(require_user), client: httpx.AsyncClient = Depends(http_client("monzo"))):
     """Get recent transactions"""
-    token = await get_valid_token()
+    token = await get_valid_token(user)
     
     # If no account_id provided, get the first account
     if not account_id:
-        async with httpx.AsyncClient() as client:
-            accounts_response = await client.get(
-                "https://api.monzo.com/accounts",
-                headers={"Authorization": f"Bearer {token}"}
+        accounts_response = await coalesced_get(client,
+            "https://api.monzo.com/accounts",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        if accounts_response.status_code == 403:
+            raise HTTPException(
+                status_code=403,
+                detail="Monzo access forbidden — please reconnect your account in the app to reauthorise access."
+            )
+        if accounts_response.status_code != 200:
+            raise HTTPException(
+                status_code=accounts_response.status_code,
+                detail=f"Failed to get Monzo accounts: {accounts_response.text}"
             )
-            if accounts_response.status_code == 403:
-                raise HTTPException(
-                    status_code=403,
-                    detail="Monzo access forbidden — please reconnect your account in the app to reauthorise access."
-                )
-            if accounts_response.status_code != 200:
-                raise HTTPException(
-                    status_code=accounts_response.status_code,
-                    detail=f"Failed to get Monzo accounts: {accounts_response.text}"
-                )
-            accounts = accounts_response.json().get("accounts", [])
-            if not accounts:
-                raise HTTPException(status_code=404, detail="No Monzo accounts found")
-            account_id = accounts[0]["id"]
+        accounts = accounts_response.json().get("accounts", [])
+        if not accounts:
+            raise HTTPException(status_code=404, detail="No Monzo accounts found")
+        account_id = accounts[0]["id"]
     
     # Get transactions from the last N days
     # Monzo requires RFC3339 format with timezone (e.g., 2009-11-10T23:00:00Z)
     since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
     
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"https://api.monzo.com/transactions?account_id={account_id}&since={since}&expand[]=merchant",
-            headers={"Authorization": f"Bearer {token}"}
+    response = await coalesced_get(client,
+        f"https://api.monzo.com/transactions?account_id={account_id}&since={since}&expand[]=merchant",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to get transactions: {response.text}"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to get transactions: {response.text}"
-            )
-        
-        transactions = response.json().get("transactions", [])
-        
-        # Convert to simplified format
-        simplified_transactions = []
-        for t in transactions:
-            if t["amount"] < 0:  # Only spending (negative amounts)
-                simplified_transactions.append({
-                    "id": t["id"],
-                    "amount": abs(t["amount"]) / 100,  # Convert to pounds
-                    "currency": t["currency"],
-                    "description": t["description"],
-                    "merchant": t.get("merchant", {}).get("name", "Unknown") if t.get("merchant") else "Unknown",
-                    "category": t["category"],
-                    "created": t["created"],
-                    "notes": t.get("notes", "")
-                })
-        
-        return {"transactions": simplified_transactions}
+    
+    transactions = response.json().get("transactions", [])
+    
+    # Convert to simplified format
+    simplified_transactions = []
+    for t in transactions:
+        if t["amount"] < 0:  # Only spending (negative amounts)
+            simplified_transactions.append({
+                "id": t["id"],
+                "amount": abs(t["amount"]) / 100,  # Convert to pounds
+                "currency": t["currency"],
+                "description": t["description"],
+                "merchant": t.get("merchant", {}).get("name", "Unknown") if t.get("merchant") else "Unknown",
+                "category": t["category"],
+                "created": t["created"],
+                "notes": t.get("notes", "")
+            })
+    
+    return {"transactions": simplified_transactions}
 
 @router.get("/balance-chart")
-async def get_balance_chart(account_id: Optional[str] = None, days: int = 7):
+async def get_balance_chart(account_id: Optional[str] = None, days: int = 7, user: User = Depends(require_user), client: httpx.AsyncClient = Depends(http_client("monzo"))):
     """Get daily balance for chart visualization"""
-    token = await get_valid_token()
+    token = await get_valid_token(user)
     
     # If no account_id provided, get the first account
     if not account_id:
-        async with httpx.AsyncClient() as client:
-            accounts_response = await client.get(
-                "https://api.monzo.com/accounts",
-                headers={"Authorization": f"Bearer {token}"}
+        accounts_response = await coalesced_get(client,
+            "https://api.monzo.com/accounts",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        if accounts_response.status_code == 403:
+            raise HTTPException(
+                status_code=403,
+                detail="Monzo access forbidden — please reconnect your account in the app to reauthorise access."
             )
-            if accounts_response.status_code == 403:
-                raise HTTPException(
-                    status_code=403,
-                    detail="Monzo access forbidden — please reconnect your account in the app to reauthorise access."
-                )
-            if accounts_response.status_code != 200:
-                raise HTTPException(
-                    status_code=accounts_response.status_code,
-                    detail=f"Failed to get Monzo accounts: {accounts_response.text}"
-                )
-            accounts = accounts_response.json().get("accounts", [])
-            if not accounts:
-                raise HTTPException(status_code=404, detail="No Monzo accounts found")
-            active_accounts = [acc for acc in accounts if not acc.get("closed", False)]
-            if not active_accounts:
-                raise HTTPException(status_code=404, detail="No active Monzo accounts found")
-            account_id = active_accounts[0]["id"]
+        if accounts_response.status_code != 200:
+            raise HTTPException(
+                status_code=accounts_response.status_code,
+                detail=f"Failed to get Monzo accounts: {accounts_response.text}"
+            )
+        accounts = accounts_response.json().get("accounts", [])
+        if not accounts:
+            raise HTTPException(status_code=404, detail="No Monzo accounts found")
+        active_accounts = [acc for acc in accounts if not acc.get("closed", False)]
+        if not active_accounts:
+            raise HTTPException(status_code=404, detail="No active Monzo accounts found")
+        account_id = active_accounts[0]["id"]
     
     # Get transactions from the last N days
     since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
     
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"https://api.monzo.com/transactions?account_id={account_id}&since={since}",
-            headers={"Authorization": f"Bearer {token}"}
+    response = await coalesced_get(client,
+        f"https://api.monzo.com/transactions?account_id={account_id}&since={since}",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to get transactions: {response.text}"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to get transactions: {response.text}"
-            )
-        
-        transactions = response.json().get("transactions", [])
+    
+    transactions = response.json().get("transactions", [])
     
     # Get current balance
-    async with httpx.AsyncClient() as client:
-        balance_response = await client.get(
-            f"https://api.monzo.com/balance?account_id={account_id}",
-            headers={"Authorization": f"Bearer {token}"}
+    balance_response = await coalesced_get(client,
+        f"https://api.monzo.com/balance?account_id={account_id}",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    
+    if balance_response.status_code != 200:
+        raise HTTPException(
+            status_code=balance_response.status_code,
+            detail=f"Failed to get balance: {balance_response.text}"
         )
-        
-        if balance_response.status_code != 200:
-            raise HTTPException(
-                status_code=balance_response.status_code,
-                detail=f"Failed to get balance: {balance_response.text}"
-            )
-        
-        current_balance = balance_response.json()["balance"] / 100
+    
+    current_balance = balance_response.json()["balance"] / 100
     
     # Calculate balance for each day by working backwards from current balance
     daily_balance = {}
@@ -556,34 +551,24 @@ async def get_balance_chart(account_id: Optional[str] = None, days: int = 7):
     }
 
 @router.post("/set-token")
-async def set_manual_token(access_token: str):
+async def set_manual_token(access_token: str, user: User = Depends(require_user)):
     """Set access token manually (from Monzo playground)"""
-    monzo_tokens["access_token"] = access_token
-    monzo_tokens["refresh_token"] = None
-    monzo_tokens["expires_at"] = None  # Manual tokens don't auto-refresh
+    # Manual tokens don't auto-refresh
+    await tokens.store(user.id, "monzo", access_token=access_token, refresh_token=None, expires_at=None)
     return {"message": "Access token set successfully"}
 
 @router.get("/status")
-async def get_monzo_status():
+async def get_monzo_status(user: User = Depends(require_user)):
     """Check if Monzo is connected"""
+    token = await get_monzo_token(user)
     return {
-        "connected": monzo_tokens["access_token"] is not None,
-        "expires_at": monzo_tokens["expires_at"],
-        "method": "oauth" if monzo_tokens["refresh_token"] else "manual"
+        "connected": bool(token and token.access_token),
+        "expires_at": token.expires_at if token else None,
+        "method": "oauth" if token and token.refresh_token else "manual"
     }
 
 @router.post("/disconnect")
-async def disconnect_monzo():
+async def disconnect_monzo(user: User = Depends(require_user)):
     """Disconnect from Monzo"""
-    monzo_tokens["access_token"] = None
-    monzo_tokens["refresh_token"] = None
-    monzo_tokens["expires_at"] = None
-    
-    # Delete token file
-    try:
-        if os.path.exists(TOKEN_FILE):
-            os.remove(TOKEN_FILE)
-    except Exception as e:
-        print(f"Error deleting token file: {e}")
-    
+    await tokens.delete(user.id, "monzo")
     return {"message": "Disconnected from Monzo"}
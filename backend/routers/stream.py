@@ -0,0 +1,179 @@
+"""
+Server-Sent Events stream for live widget updates.
+
+One poller per source (per user for the per-user sources, shared by everyone
+for the rest) fetches its source on that source's own schedule and pushes a payload to every subscribed client only when it has
+changed. Upstream request volume therefore depends on the poll schedule, not
+on how many dashboards are open.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from backend.auth import require_user
+from backend.models import User
+from .dashboard import WIDGETS
+
+router = APIRouter()
+
+# Source name -> poll interval in seconds. Loaders are shared with /api/dashboard.
+SOURCES: Dict[str, float] = {
+    "spotify_track": 5,
+    "spotify_queue": 15,
+    "bus": 30,
+    "bus_locations": 30,
+    "weather": 600,
+    "garmin_stats": 600,
+}
+# Sources whose payload depends on the user; the rest get one poller for everyone
+USER_SOURCES = {"spotify_track", "spotify_queue"}
+KEEPALIVE_SECONDS = 15
+QUEUE_SIZE = 50
+
+
+class SourcePoller:
+    """Polls one source (for one user, or for everyone) and fans changed payloads out to subscribers."""
+
+    def __init__(self, name: str, interval: float, load: Callable[[], Awaitable]):
+        self.name = name
+        self.interval = interval
+        self.load = load
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.last_payload: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def run(self):
+        while True:
+            try:
+                data = await self.load()
+            except HTTPException as e:
+                data = {"error": e.detail, "status_code": e.status_code}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stream source {self.name} failed: {e}")
+                data = None
+
+            if data is not None:
+                payload = json.dumps(jsonable_encoder(data), sort_keys=True)
+                if payload != self.last_payload:
+                    self.last_payload = payload
+                    for queue in list(self.subscribers):
+                        _offer(queue, (self.name, payload))
+
+            await asyncio.sleep(self.interval)
+
+
+def _offer(queue: asyncio.Queue, item: Tuple[str, str]):
+    """Queue an event, dropping the oldest one if a slow client has fallen behind."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+
+def _key(name: str, user: User) -> Tuple[str, Optional[int]]:
+    return name, user.id if name in USER_SOURCES else None
+
+
+class StreamHub:
+    """Tracks pollers and subscribers; pollers run only while someone is listening."""
+
+    def __init__(self):
+        self._pollers: Dict[Tuple[str, Optional[int]], SourcePoller] = {}
+
+    def subscribe(self, user: User, sources: List[str]) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        for name in sources:
+            poller = self._pollers.get(_key(name, user))
+            if poller is None:
+                poller = SourcePoller(name, SOURCES[name], lambda name=name: WIDGETS[name](user))
+                self._pollers[_key(name, user)] = poller
+                poller.start()
+            poller.subscribers.add(queue)
+            # Send the latest known value straight away
+            if poller.last_payload is not None:
+                _offer(queue, (name, poller.last_payload))
+        return queue
+
+    def unsubscribe(self, user: User, sources: List[str], queue: asyncio.Queue):
+        for name in sources:
+            poller = self._pollers.get(_key(name, user))
+            if poller is None:
+                continue
+            poller.subscribers.discard(queue)
+            if not poller.subscribers:
+                poller.stop()
+                del self._pollers[_key(name, user)]
+
+    async def stop_all(self):
+        """Cancel every poller (called from main.lifespan on shutdown)."""
+        pollers = list(self._pollers.values())
+        self._pollers.clear()
+        for poller in pollers:
+            poller.stop()
+        await asyncio.gather(*[p.task for p in pollers if p.task], return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            (f"{name}:{user_id}" if user_id is not None else name): {"subscribers": len(p.subscribers), "interval_seconds": p.interval}
+            for (name, user_id), p in self._pollers.items()
+        }
+
+
+hub = StreamHub()
+
+
+@router.get("")
+async def stream(
+    request: Request,
+    sources: Optional[str] = None,
+    user: User = Depends(require_user)
+):
+    """
+    Subscribe to live widget updates as Server-Sent Events.
+
+    sources: optional comma-separated subset of SOURCES (default: all).
+    Each event is named after its source and carries the same JSON the
+    matching REST endpoint returns; a comment line is sent as a keepalive.
+    """
+    names = [s.strip() for s in sources.split(",") if s.strip()] if sources else list(SOURCES)
+    unknown = [name for name in names if name not in SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sources: {', '.join(unknown)}")
+
+    queue = hub.subscribe(user, names)
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    name, payload = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {name}\ndata: {payload}\n\n"
+        finally:
+            hub.unsubscribe(user, names, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+async def stream_stats(user: User = Depends(require_user)):
+    """Active pollers and their subscriber counts."""
+    return hub.stats()
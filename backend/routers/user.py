@@ -1,13 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlmodel import select, Session
 from sqlmodel.ext.asyncio.session import AsyncSession
 from backend.database import engine, get_session
-from backend.models import UserConfig, User
-from backend.auth import get_current_user, require_user
+from backend.models import UserConfig, User, TokenRefreshStatus
+from backend.auth import get_current_user, require_user, invalidate_principal
 from pydantic import BaseModel
 from typing import Optional
 import httpx
 import os
+from backend.http_clients import get_client
+from backend.cache import cache
 
 router = APIRouter()
 
@@ -25,39 +27,56 @@ async def get_current_user_info(user: User = Depends(require_user)):
     }
 
 @router.get("/logout")
-async def logout():
+async def logout(request: Request):
     """Logout endpoint (client should clear cookies)."""
+    token = request.headers.get("authorization", "").removeprefix("Bearer ").strip() or request.cookies.get("access_token")
+    invalidate_principal(token=token)
     return {"message": "Logged out successfully"}
 
+@router.get("/token-refresh-status")
+async def get_token_refresh_status(user: User = Depends(require_user), session: AsyncSession = Depends(get_session)):
+    """Last background OAuth refresh outcome per connected service."""
+    result = await session.execute(select(TokenRefreshStatus).where(TokenRefreshStatus.user_id == user.id))
+    return [
+        {
+            "service": status.service,
+            "last_attempt_at": status.last_attempt_at.isoformat() if status.last_attempt_at else None,
+            "last_success_at": status.last_success_at.isoformat() if status.last_success_at else None,
+            "last_error": status.last_error,
+            "consecutive_failures": status.consecutive_failures,
+        }
+        for status in result.scalars()
+    ]
+
 async def geocode_with_nominatim(address: str) -> tuple[Optional[float], Optional[float]]:
     """Geocode using OpenStreetMap Nominatim (free, no API key required)."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={
-                    "q": address,
-                    "format": "json",
-                    "limit": 1,
-                    "addressdetails": 1
-                },
-                headers={
-                    "User-Agent": "LifeOS/1.0 (contact: lifeos@example.com)"
-                },
-                timeout=15.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data and len(data) > 0:
-                    lat = float(data[0]["lat"])
-                    lon = float(data[0]["lon"])
-                    print(f"✓ Nominatim geocoded '{address}' to ({lat}, {lon})")
-                    return lat, lon
-                else:
-                    print(f"⚠ Nominatim: No results for '{address}'")
+        client = get_client("geocoding")
+        response = await client.get(
+            "https://nominatim.openstreetmap.org/search",
+            params={
+                "q": address,
+                "format": "json",
+                "limit": 1,
+                "addressdetails": 1
+            },
+            headers={
+                "User-Agent": "LifeOS/1.0 (contact: lifeos@example.com)"
+            },
+            timeout=15.0
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if data and len(data) > 0:
+                lat = float(data[0]["lat"])
+                lon = float(data[0]["lon"])
+                print(f"✓ Nominatim geocoded '{address}' to ({lat}, {lon})")
+                return lat, lon
             else:
-                print(f"⚠ Nominatim returned status {response.status_code}")
+                print(f"⚠ Nominatim: No results for '{address}'")
+        else:
+            print(f"⚠ Nominatim returned status {response.status_code}")
     except Exception as e:
         print(f"⚠ Nominatim error for '{address}': {e}")
     
@@ -70,26 +89,26 @@ async def geocode_with_google(address: str) -> tuple[Optional[float], Optional[f
         return None, None
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://maps.googleapis.com/maps/api/geocode/json",
-                params={
-                    "address": address,
-                    "key": api_key
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "OK" and data.get("results"):
-                    location = data["results"][0]["geometry"]["location"]
-                    lat = location["lat"]
-                    lon = location["lng"]
-                    print(f"✓ Google geocoded '{address}' to ({lat}, {lon})")
-                    return lat, lon
-                else:
-                    print(f"⚠ Google Geocoding status: {data.get('status')}")
+        client = get_client("geocoding")
+        response = await client.get(
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            params={
+                "address": address,
+                "key": api_key
+            },
+            timeout=10.0
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("status") == "OK" and data.get("results"):
+                location = data["results"][0]["geometry"]["location"]
+                lat = location["lat"]
+                lon = location["lng"]
+                print(f"✓ Google geocoded '{address}' to ({lat}, {lon})")
+                return lat, lon
+            else:
+                print(f"⚠ Google Geocoding status: {data.get('status')}")
     except Exception as e:
         print(f"⚠ Google Geocoding error for '{address}': {e}")
     
@@ -102,27 +121,27 @@ async def geocode_with_positionstack(address: str) -> tuple[Optional[float], Opt
         return None, None
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "http://api.positionstack.com/v1/forward",
-                params={
-                    "access_key": api_key,
-                    "query": address,
-                    "limit": 1
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("data") and len(data["data"]) > 0:
-                    result = data["data"][0]
-                    lat = result["latitude"]
-                    lon = result["longitude"]
-                    print(f"✓ Positionstack geocoded '{address}' to ({lat}, {lon})")
-                    return lat, lon
-                else:
-                    print(f"⚠ Positionstack: No results for '{address}'")
+        client = get_client("geocoding")
+        response = await client.get(
+            "http://api.positionstack.com/v1/forward",
+            params={
+                "access_key": api_key,
+                "query": address,
+                "limit": 1
+            },
+            timeout=10.0
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("data") and len(data["data"]) > 0:
+                result = data["data"][0]
+                lat = result["latitude"]
+                lon = result["longitude"]
+                print(f"✓ Positionstack geocoded '{address}' to ({lat}, {lon})")
+                return lat, lon
+            else:
+                print(f"⚠ Positionstack: No results for '{address}'")
     except Exception as e:
         print(f"⚠ Positionstack error for '{address}': {e}")
     
@@ -281,6 +300,9 @@ async def update_user_config(
             await session.commit()
             await session.refresh(config)
         
+        # Bus stops/routes may have changed - drop cached live transport data
+        cache.invalidate("transport")
+        
         # Build response while still in session context
         return {
             "message": "Configuration updated successfully",
@@ -0,0 +1,54 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight coroutine
+instead of each hitting the upstream. The result (or exception) is handed to
+every waiter, and the key is released as soon as the call finishes, so this
+never serves stale data - it only collapses simultaneous misses.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import httpx
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0    # Calls that actually ran
+        self.followers = 0  # Calls that joined an in-flight call
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() unless a call for key is already in flight, then await its result."""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.followers += 1
+        # Shield so one cancelled caller doesn't cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
+
+
+group = SingleFlight()
+
+
+def _freeze(mapping: Optional[dict]) -> tuple:
+    return tuple(sorted((str(k), str(v)) for k, v in (mapping or {}).items()))
+
+
+async def coalesced_get(client: httpx.AsyncClient, url: str, params: Optional[dict] = None,
+                        headers: Optional[dict] = None) -> httpx.Response:
+    """
+    GET through the single-flight group, keyed by upstream request identity
+    (URL, query params and headers, which include the caller's auth token).
+    """
+    key = ("GET", url, _freeze(params), _freeze(headers))
+    return await group.do(key, lambda: client.get(url, params=params, headers=headers))
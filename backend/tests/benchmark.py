@@ -0,0 +1,559 @@
+"""
+Offline benchmark for the LifeOS API.
+
+Starts one local stub server that impersonates TransportAPI, Spotify, Monzo,
+OpenWeather, Home Assistant, DVLA, Nominatim and Garmin (routed by Host header,
+each with configurable latency and payload size), points the shared upstream
+clients at it, seeds a throwaway SQLite database, then drives every GET /api/*
+endpoint through an in-process ASGI client and reports throughput and tail
+latency per endpoint.
+
+Nothing touches the real services or your real database.
+
+Run from the repo root:
+    python -m backend.tests.benchmark
+    python -m backend.tests.benchmark --requests 500 --concurrency 20 --only bus
+    python -m backend.tests.benchmark --latency garmin=0.8,spotify=0.05 --payload monzo=500
+    python -m backend.tests.benchmark --cold            # clear the response cache before every request
+    python -m backend.tests.benchmark --json out.json   # save results
+    python -m backend.tests.benchmark --baseline out.json --tolerance 1.25   # exit 1 on regressions
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# --- Isolated environment (must be set before importing the backend) ---
+WORK_DIR = tempfile.mkdtemp(prefix="lifeos-bench-")
+os.environ.update({
+    "DATABASE_URL": "sqlite+aiosqlite:///" + os.path.join(WORK_DIR, "bench.db"),
+    "PERSONAL_MODE": "true",
+    "TRANSPORT_APP_ID": "stub",
+    "TRANSPORT_APP_KEY": "stub",
+    "MORNING_STOPS": "4200F225601,4200F063500",
+    "EVENING_STOPS": "4200F147402",
+    "RELEVANT_ROUTES": "U1,U2,11",
+    "OPENWEATHER_API_KEY": "stub",
+    "HA_BASE_URL": "http://homeassistant.local:8123",
+    "HA_TOKEN": "stub",
+    "DVLA_API_KEY": "stub",
+    "JWT_SECRET_KEY": "benchmark",
+})
+os.chdir(WORK_DIR)  # Anything that writes relative files (sync engine, token files) lands here
+
+import httpx
+import requests
+import uvicorn
+from fastapi.routing import APIRoute
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from backend import http_clients
+from backend.cache import cache
+from backend.database import async_session_maker, engine
+from backend.http_clients import InstrumentedTransport
+from backend.main import app
+from backend.models import SQLModel, User, UserToken, Plant, Car, Workout, Exercise, Set
+from backend.routers import garmin
+
+# Simulated upstream latency (seconds) and payload size (list items) per provider
+DEFAULT_LATENCY = {
+    "transport": 0.15,
+    "spotify": 0.08,
+    "monzo": 0.12,
+    "weather": 0.06,
+    "homeassistant": 0.02,
+    "dvla": 0.10,
+    "geocoding": 0.20,
+    "garmin": 0.30,
+}
+DEFAULT_PAYLOAD = {
+    "transport": 10,
+    "spotify": 20,
+    "monzo": 50,
+    "weather": 40,
+    "homeassistant": 40,
+    "dvla": 1,
+    "geocoding": 1,
+    "garmin": 720,  # Intraday heart-rate samples per day (2 min resolution)
+}
+HOSTS = {
+    "transportapi.com": "transport",
+    "api.spotify.com": "spotify",
+    "accounts.spotify.com": "spotify",
+    "api.monzo.com": "monzo",
+    "api.openweathermap.org": "weather",
+    "homeassistant.local": "homeassistant",
+    "driver-vehicle-licensing.api.gov.uk": "dvla",
+    "nominatim.openstreetmap.org": "geocoding",
+    "connectapi.garmin.com": "garmin",
+}
+
+# Endpoints that can't be benchmarked meaningfully (OAuth redirects, endless streams,
+# calls that construct their own SDK clients, state-changing GETs)
+SKIP = {
+    "/api/init-db",
+    "/api/stream",
+    "/api/google/login",
+    "/api/google/callback",
+    "/api/spotify/auth",
+    "/api/spotify/callback",
+    "/api/monzo/auth",
+    "/api/monzo/callback",
+    "/api/garmin/status",
+    "/api/user/logout",
+    # spotify.get_context_info uses `user` and `session` without declaring them, so it always 500s
+    "/api/spotify/context/{context_type}/{context_id}",
+}
+PATH_PARAMS = {
+    "workout_id": "1",
+    "car_id": "1",
+    "atco_code": "4200F225601",
+    "license_plate": "AB12CDE",
+    "context_type": "playlist",
+    "context_id": "37i9dQZF1DXcBWIGoYBM5M",
+    "activity_id": "1000",
+}
+QUERY_PARAMS = {
+    "/api/bus/stops/search": {"lat": 52.2919, "lon": -1.5377},
+    "/api/weather/forecast": {"city_id": "dublin"},
+    "/api/user/geocode": {"address": "Leamington Spa, UK"},
+}
+
+
+# --- Stub upstreams ---
+
+def _hhmm(minutes_from_now: int) -> str:
+    return (datetime.now() + timedelta(minutes=minutes_from_now)).strftime("%H:%M")
+
+
+def _iso(days_ago: float) -> str:
+    return (datetime.utcnow() - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _departures(n):
+    lines = ["U1", "U2", "11"]
+    return [{
+        "line_name": lines[i % 3], "direction": "University of Warwick", "operator": "SCNH",
+        "operator_name": "Stagecoach", "aimed_departure_time": _hhmm(i * 4),
+        "expected_departure_time": _hhmm(i * 4 + i % 2), "best_departure_estimate": _hhmm(i * 4 + i % 2),
+    } for i in range(n)]
+
+
+def _track(i):
+    return {
+        "name": f"Track {i}", "uri": f"spotify:track:{i:022d}", "duration_ms": 180000 + i,
+        "artists": [{"name": f"Artist {i}"}],
+        "album": {"name": f"Album {i}", "images": [{"url": f"https://i.scdn.co/image/{i}"}]},
+    }
+
+
+def _stub_routes():
+    """(provider, path regex, handler(match, params, n)) -> JSON payload"""
+    return [
+        ("transport", r"/v3/uk/bus/stop/([^/]+)/live\.json", lambda m, q, n: {
+            "atcocode": m.group(1), "name": f"Stop {m.group(1)}", "indicator": "Stand K",
+            "locality_name": "Leamington Spa", "departures": {"all": _departures(n)}}),
+        ("transport", r"/v3/uk/bus/service_timetables/([^/]+)/([^/]+)\.json", lambda m, q, n: {
+            "timetables": [{"destination": "University of Warwick", "vehicle_positions": [
+                {"latitude": 52.29 + i * 0.01, "longitude": -1.53 - i * 0.01, "bearing": 90,
+                 "recorded_at_time": datetime.utcnow().isoformat()} for i in range(max(n // 2, 1))]}]}),
+        ("transport", r"/v3/uk/bus/stops/near\.json", lambda m, q, n: {"stops": [
+            {"atcocode": f"4200F{i:06d}", "name": f"Stop {i}", "latitude": 52.29, "longitude": -1.53,
+             "indicator": "", "locality_name": "Leamington Spa", "distance": i * 10} for i in range(n)]}),
+        ("spotify", r"/v1/me/player", lambda m, q, n: {
+            "is_playing": True, "progress_ms": 60000, "currently_playing_type": "track", "item": _track(0),
+            "device": {"volume_percent": 40}, "context": {"type": "playlist", "uri": "spotify:playlist:x",
+                                                         "external_urls": {"spotify": "https://open.spotify.com"}}}),
+        ("spotify", r"/v1/me/player/currently-playing", lambda m, q, n: {
+            "is_playing": True, "progress_ms": 60000, "item": _track(0)}),
+        ("spotify", r"/v1/me/player/queue", lambda m, q, n: {
+            "currently_playing": _track(0), "queue": [_track(i) for i in range(1, n + 1)]}),
+        ("spotify", r"/v1/(\w+)s/([^/]+)", lambda m, q, n: {
+            "name": "Stub Playlist", "owner": {"display_name": "stub"}, "tracks": {"total": n}}),
+        ("spotify", r"/api/token", lambda m, q, n: {
+            "access_token": "stub-refreshed", "token_type": "Bearer", "expires_in": 3600}),
+        ("monzo", r"/oauth2/token", lambda m, q, n: {
+            "access_token": "stub-refreshed", "refresh_token": "stub-next", "expires_in": 21600}),
+        ("monzo", r"/ping/whoami", lambda m, q, n: {"authenticated": True, "user_id": "user_stub"}),
+        ("monzo", r"/accounts", lambda m, q, n: {"accounts": [{"id": "acc_stub", "closed": False}]}),
+        ("monzo", r"/balance", lambda m, q, n: {
+            "balance": 123456, "total_balance": 150000, "currency": "GBP", "spend_today": -1234}),
+        ("monzo", r"/transactions", lambda m, q, n: {"transactions": [{
+            "id": f"tx_{i}", "amount": -(100 + i), "currency": "GBP", "description": f"Shop {i}",
+            "merchant": {"name": f"Shop {i}"}, "category": "groceries", "created": _iso(i * 7 / n),
+            "notes": ""} for i in range(n)]}),
+        ("weather", r"/data/2\.5/weather", lambda m, q, n: {
+            "main": {"temp": 14.2, "feels_like": 13.1, "humidity": 81},
+            "weather": [{"description": "light rain", "icon": "10d"}], "wind": {"speed": 4.1}}),
+        ("weather", r"/data/2\.5/forecast", lambda m, q, n: {"list": [{
+            "dt_txt": (datetime.utcnow() + timedelta(hours=3 * i)).strftime("%Y-%m-%d %H:%M:%S"),
+            "main": {"temp": 12 + i % 5}, "weather": [{"description": "clouds", "icon": "04d"}]}
+            for i in range(n)]}),
+        ("homeassistant", r"/api/states", lambda m, q, n: [{
+            "entity_id": f"{['light', 'switch', 'sensor', 'lock'][i % 4]}.device_{i}", "state": "on",
+            "attributes": {"friendly_name": f"Device {i}"}} for i in range(n)]),
+        ("dvla", r"/vehicle-enquiry/v1/vehicles", lambda m, q, n: {
+            "make": "TOYOTA", "model": "COROLLA", "yearOfManufacture": 2018, "colour": "BLUE",
+            "fuelType": "PETROL", "motExpiryDate": "2027-01-01", "taxStatus": "Taxed", "taxDueDate": "2027-01-01"}),
+        ("geocoding", r"/search", lambda m, q, n: [{"lat": "52.2919", "lon": "-1.5377"}]),
+        ("garmin", r"/garmin/get_stats", lambda m, q, n: {
+            "totalSteps": 8421, "totalKilocalories": 2210, "totalDistanceMeters": 6400,
+            "moderateIntensityMinutes": 20, "vigorousIntensityMinutes": 12, "floorsAscended": 9,
+            "restingHeartRate": 52, "maxHeartRate": 151, "minHeartRate": 47,
+            "averageStressLevel": 31, "maxStressLevel": 88}),
+        ("garmin", r"/garmin/get_sleep_data", lambda m, q, n: {"dailySleepDTO": {
+            "sleepTimeSeconds": 27000, "deepSleepSeconds": 5400, "lightSleepSeconds": 14400,
+            "remSleepSeconds": 6000, "awakeSleepSeconds": 1200, "sleepScores": {"overall": {"value": 81}},
+            "sleepStartTimestampLocal": 0, "sleepEndTimestampLocal": 0}}),
+        ("garmin", r"/garmin/get_activities", lambda m, q, n: [{
+            "activityId": 1000 + i, "activityName": f"Run {i}", "activityType": {"typeKey": "running"},
+            "startTimeLocal": _iso(i).replace("T", " ")[:19], "duration": 1800.0, "distance": 5000.0,
+            "calories": 400, "averageHR": 145, "maxHR": 170} for i in range(int(q.get("limit", 5)))]),
+        ("garmin", r"/garmin/get_activity_details", lambda m, q, n: {"geoPolylineDTO": {"polyline": [
+            {"lat": 51.5 + 0.0001 * i, "lon": -0.1 + 0.0001 * (i % 50), "time": 1700000000000 + i * 1000}
+            for i in range(n * 20)]}}),
+        ("garmin", r"/garmin/get_heart_rates", lambda m, q, n: {
+            "restingHeartRate": 52, "maxHeartRate": 151, "minHeartRate": 47,
+            "heartRateValues": [[1700000000000 + i * 120000, 55 + (i * 7) % 60] for i in range(n)]}),
+        ("garmin", r"/garmin/get_body_composition", lambda m, q, n: {"weight": 74500}),
+        ("garmin", r"/garmin/get_stress_data", lambda m, q, n: {"avgStressLevel": 31, "maxStressLevel": 88}),
+    ]
+
+
+class StubServer:
+    """All stub upstreams behind one local uvicorn server, running in its own thread."""
+
+    def __init__(self, latency: dict, payload: dict, jitter: float = 0.2, seed: int = 1):
+        self.latency = latency
+        self.payload = payload
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.routes = [(provider, re.compile(pattern + "$"), fn) for provider, pattern, fn in _stub_routes()]
+        self.requests = 0
+        self.port = None
+        self.app = Starlette(routes=[Route("/{path:path}", self.handle, methods=["GET", "POST", "PUT"])])
+
+    async def handle(self, request: Request) -> Response:
+        self.requests += 1
+        host = request.headers.get("host", "").split(":")[0]
+        provider = HOSTS.get(host)
+        for route_provider, pattern, fn in self.routes:
+            match = pattern.match(request.url.path)
+            if route_provider == provider and match:
+                delay = self.latency[provider] * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+                await asyncio.sleep(max(delay, 0))
+                return JSONResponse(fn(match, dict(request.query_params), self.payload[provider]))
+        return JSONResponse({"error": f"no stub for {host}{request.url.path}"}, status_code=404)
+
+    def start(self):
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        self.port = self.server.servers[0].sockets[0].getsockname()[1]
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+class _StubRoute(httpx.AsyncBaseTransport):
+    """Send every request to the local stub server, keeping the original Host header."""
+
+    def __init__(self, port: int, transport: httpx.AsyncBaseTransport):
+        self.port = port
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.port)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def install_stub_clients(port: int):
+    """Replace the shared upstream clients with ones routed to the stub server (HTTP/1.1 only)."""
+    for provider in http_clients.PROVIDERS:
+        config = {**http_clients.DEFAULT_CONFIG, **http_clients.PROVIDERS[provider]}
+        limits = httpx.Limits(max_connections=config["max_connections"],
+                              max_keepalive_connections=config["max_keepalive"],
+                              keepalive_expiry=config["keepalive_expiry"])
+        transport = _StubRoute(port, httpx.AsyncHTTPTransport(limits=limits))
+        http_clients._clients[provider] = httpx.AsyncClient(
+            transport=InstrumentedTransport(provider, transport, config["connect_retries"]),
+            timeout=httpx.Timeout(config["timeout"]),
+            follow_redirects=config["follow_redirects"],
+            headers=config["headers"],
+        )
+
+
+class StubGarmin:
+    """Stands in for garminconnect.Garmin: same method names, blocking HTTP to the stub server."""
+
+    def __init__(self, port: int):
+        self.base_url = f"http://127.0.0.1:{port}/garmin"
+        # Session that never needs refreshing and is never written to disk
+        self.garth = SimpleNamespace(
+            sess=requests.Session(),
+            oauth2_token=SimpleNamespace(expires_at=float("inf")),
+            dumps=lambda: "stub",
+            dump=lambda path: None,
+        )
+
+    def _get(self, method: str, **params):
+        response = self.garth.sess.get(f"{self.base_url}/{method}", params=params,
+                                       headers={"Host": "connectapi.garmin.com"})
+        response.raise_for_status()
+        return response.json()
+
+    def get_stats(self, cdate):
+        return self._get("get_stats", date=cdate)
+
+    def get_sleep_data(self, cdate):
+        return self._get("get_sleep_data", date=cdate)
+
+    def get_activities(self, start=0, limit=20):
+        return self._get("get_activities", start=start, limit=limit)
+
+    def get_activity_details(self, activity_id, maxchart=2000, maxpoly=4000):
+        return self._get("get_activity_details", activity_id=activity_id)
+
+    def get_heart_rates(self, cdate):
+        return self._get("get_heart_rates", date=cdate)
+
+    def get_body_composition(self, startdate, enddate=None):
+        return self._get("get_body_composition", date=startdate)
+
+    def get_stress_data(self, cdate):
+        return self._get("get_stress_data", date=cdate)
+
+
+def install_stub_garmin(port: int):
+    garmin._client = garmin._instrument(StubGarmin(port))
+
+
+# --- Seed data ---
+
+async def seed_database():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_session_maker() as session:
+        user = User(email="comadden@gmail.com", name="Benchmark User")
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+        session.add(UserToken(user_id=user.id, service="spotify", access_token="stub", refresh_token="stub",
+                              expires_at=datetime.now() + timedelta(days=1)))
+        session.add(UserToken(user_id=user.id, service="monzo", access_token="stub", refresh_token="stub",
+                              expires_at=datetime.now() + timedelta(days=1)))
+        session.add(Plant(name="Fern", species="Nephrolepis", watering_frequency_days=7, user_id=user.id))
+        session.add(Car(name="My Car", make="Toyota", model="Corolla", year=2018, current_mileage=45000,
+                        license_plate="AB12CDE", user_id=user.id))
+        for i in range(30):
+            workout = Workout(name=f"Workout {i}", date=datetime.utcnow() - timedelta(days=i * 2))
+            workout.exercises = [
+                Exercise(name=name, order=j, sets=[Set(set_number=k + 1, weight_kg=40 + k * 5, reps=8)
+                                                   for k in range(3)])
+                for j, name in enumerate(["Squat", "Bench Press", "Row"])
+            ]
+            session.add(workout)
+        await session.commit()
+
+
+# --- Driver ---
+
+def discover_endpoints(only=None):
+    """Every GET /api/* route, with sample path and query parameters filled in."""
+    endpoints = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or "GET" not in route.methods:
+            continue
+        if not route.path.startswith("/api") or route.path in SKIP:
+            continue
+        if only and not any(o in route.path for o in only):
+            continue
+        path = re.sub(r"\{(\w+)(:\w+)?\}", lambda m: PATH_PARAMS.get(m.group(1), "1"), route.path)
+        endpoints.append((route.path, path, QUERY_PARAMS.get(route.path, {})))
+    return endpoints
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def bench_endpoint(client, path, params, total, concurrency, warmup, cold):
+    for _ in range(warmup):
+        if cold:
+            cache.clear()
+        await client.get(path, params=params)
+
+    latencies, statuses = [], {}
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            if cold:
+                cache.clear()
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 400)
+    return {
+        "requests": total,
+        "errors": errors,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def print_report(results: dict):
+    width = max([len(path) for path in results] + [8])
+    print(f"\n{'endpoint'.ljust(width)}  {'req':>5} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    print("-" * (width + 60))
+    for path, r in results.items():
+        print(f"{path.ljust(width)}  {r['requests']:>5} {r['errors']:>5} {r['throughput_rps']:>8} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['max_ms']:>8}")
+
+
+MIN_DELTA_MS = 2.0
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Endpoints whose p95 grew or throughput dropped by more than the tolerance factor."""
+    regressions = []
+    for path, r in results.items():
+        base = baseline.get(path)
+        if not base:
+            continue
+        if r["p95_ms"] - base["p95_ms"] < MIN_DELTA_MS:
+            slower = False  # Sub-millisecond endpoints are too noisy to compare by ratio
+        else:
+            slower = r["p95_ms"] > base["p95_ms"] * tolerance
+        if slower:
+            regressions.append(f"{path}: p95 {base['p95_ms']}ms -> {r['p95_ms']}ms")
+        if slower and r["throughput_rps"] < base["throughput_rps"] / tolerance:
+            regressions.append(f"{path}: throughput {base['throughput_rps']} -> {r['throughput_rps']} req/s")
+        if r["errors"] > base["errors"]:
+            regressions.append(f"{path}: errors {base['errors']} -> {r['errors']}")
+    return regressions
+
+
+def parse_overrides(value: str, defaults: dict, cast) -> dict:
+    """'garmin=0.8,spotify=0.05' -> defaults with those providers overridden"""
+    result = dict(defaults)
+    for item in filter(None, (value or "").split(",")):
+        provider, _, amount = item.partition("=")
+        if provider.strip() not in result:
+            raise SystemExit(f"Unknown provider '{provider}'. Choose from: {', '.join(result)}")
+        result[provider.strip()] = cast(amount)
+    return result
+
+
+async def run(args) -> int:
+    latency = parse_overrides(args.latency, DEFAULT_LATENCY, float)
+    if args.latency_scale != 1:
+        latency = {p: v * args.latency_scale for p, v in latency.items()}
+    payload = parse_overrides(args.payload, DEFAULT_PAYLOAD, int)
+
+    stubs = StubServer(latency, payload, jitter=args.jitter)
+    stubs.start()
+    print(f"Stub upstreams on 127.0.0.1:{stubs.port} (work dir {WORK_DIR})")
+
+    endpoints = discover_endpoints(args.only)
+    results = {}
+    async with app.router.lifespan_context(app):
+        install_stub_clients(stubs.port)
+        install_stub_garmin(stubs.port)
+        await seed_database()
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for template, path, params in endpoints:
+                cache.clear()
+                # Routers print a lot of debug output; keep it out of the report unless asked for
+                with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                    results[template] = await bench_endpoint(
+                        client, path, params, args.requests, args.concurrency, args.warmup, args.cold)
+                r = results[template]
+                print(f"  {'✓' if not r['errors'] else '✗'} {template}: {r['throughput_rps']} req/s, "
+                      f"p95 {r['p95_ms']}ms")
+    stubs.stop()
+
+    print_report(results)
+    print(f"\nStub upstream requests served: {stubs.requests}")
+
+    if args.json:
+        with open(args.json_path, "w") as f:
+            json.dump({"config": {"latency": latency, "payload": payload, "requests": args.requests,
+                                  "concurrency": args.concurrency, "cold": args.cold},
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) vs {args.baseline}:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\n✓ No regressions vs {args.baseline} (tolerance x{args.tolerance})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every GET /api/* endpoint against local stub upstreams")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients per endpoint")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per endpoint first")
+    parser.add_argument("--only", nargs="*", help="Only endpoints whose path contains one of these")
+    parser.add_argument("--latency", help="Per-provider upstream latency in seconds, e.g. garmin=0.8,spotify=0.05")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply every upstream latency")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency jitter as a fraction (+/-)")
+    parser.add_argument("--payload", help="Per-provider payload size in list items, e.g. monzo=500")
+    parser.add_argument("--cold", action="store_true", help="Clear the response cache before every request")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous --json file and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown factor vs baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own print output")
+    args = parser.parse_args()
+    args.json = bool(args.json_path)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
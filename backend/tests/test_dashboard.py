@@ -0,0 +1,32 @@
+"""Test the aggregated dashboard's google widget against a seeded local index (no Google calls)
+
+Run with: python -m pytest backend/tests/test_dashboard.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, '.')
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+
+from backend.routers import dashboard
+from backend.tests.test_google_data import seed_google_user
+
+
+async def _google_widget():
+    user = await seed_google_user("dashboard-test@example.com")
+    return await dashboard.get_dashboard(widgets="google", deadline=5, user=user)
+
+
+def test_google_widget():
+    result = asyncio.run(_google_widget())["widgets"]["google"]
+    assert result["status"] == "ok", result
+    assert result["data"]["authenticated"] is True
+    assert [email["id"] for email in result["data"]["emails"]] == ["message-1"]
+    assert [event["title"] for event in result["data"]["calendar"]] == ["Dentist"]
+
+
+if __name__ == "__main__":
+    test_google_widget()
+    print("✓ Dashboard google widget loads")
@@ -0,0 +1,64 @@
+"""Test /api/google/data against a seeded local Gmail/Calendar index (no Google calls)
+
+Run with: python -m pytest backend/tests/test_google_data.py
+"""
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, '.')
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+
+from sqlmodel import SQLModel
+
+from backend.database import async_session_maker, engine
+from backend.models import CalendarEvent, EmailMessage, SyncState, User, UserToken
+from backend.routers import google
+
+
+async def seed_google_user(email: str = "google-test@example.com") -> User:
+    """A user with a valid Google token, both sync cursors fresh, and one event and email stored"""
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    now = datetime.datetime.utcnow()
+    async with async_session_maker() as session:
+        user = User(email=email, name="Test")
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+        session.add(UserToken(user_id=user.id, service="google", access_token="test",
+                              refresh_token="refresh", expires_at=now + datetime.timedelta(hours=1)))
+        for source in (google.google_sync.CALENDAR, google.google_sync.GMAIL):
+            session.add(SyncState(user_id=user.id, source=source, cursor="cursor",
+                                  last_synced_at=now, last_full_sync_at=now))
+        start = now + datetime.timedelta(hours=2)
+        session.add(CalendarEvent(user_id=user.id, event_id="event-1", title="Dentist", start=start,
+                                  end=start + datetime.timedelta(hours=1),
+                                  start_local=start.replace(microsecond=0).isoformat() + "+00:00"))
+        session.add(EmailMessage(user_id=user.id, message_id="message-1", sender='"Amazon" <noreply@amazon.com>',
+                                 subject="Your order", date=now, labels=",INBOX,UNREAD,"))
+        await session.commit()
+        await session.refresh(user)
+        return user
+
+
+async def _get_google_data():
+    user = await seed_google_user()
+    async with async_session_maker() as session:
+        return await google.get_google_data(max_emails=None, user=user, session=session)
+
+
+def test_google_data_with_synced_cursors():
+    data = asyncio.run(_get_google_data())
+    assert data["authenticated"] is True
+    assert [email["id"] for email in data["emails"]] == ["message-1"]
+    assert data["emails"][0]["from"] == "Amazon"
+    assert data["emails"][0]["unread"] is True
+    assert [event["title"] for event in data["calendar"]] == ["Dentist"]
+
+
+if __name__ == "__main__":
+    test_google_data_with_synced_cursors()
+    print("✓ get_google_data reads both local stores")
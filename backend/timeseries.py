@@ -0,0 +1,49 @@
+"""
+Downsampling for chart series.
+
+lttb() implements Largest-Triangle-Three-Buckets (Steinarsson, 2013): the first
+and last points are kept, the rest are split into equal buckets and from each
+bucket the point forming the largest triangle with the previously kept point
+and the next bucket's average is kept. Peaks and dips survive, unlike with
+striding or averaging. Bucket averages are computed up front and each bucket's
+areas in one vectorised step, so only the (inherently sequential) selection
+loops in Python.
+"""
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the n_out points of (x, y) that LTTB keeps (all of them if n_out >= len(x))."""
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("LTTB needs at least 3 output points")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket b (0 <= b < n_out - 2) covers [edges[b], edges[b + 1]) of the inner points
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # The bucket after the last one is just the last point
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        area = np.abs(
+            (x[a] - next_x[b]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y[b] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
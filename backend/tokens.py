@@ -0,0 +1,313 @@
+"""
+OAuth token manager.
+
+Keeps UserToken rows in memory so hot endpoints don't query the DB for a
+token on every poll, and serialises refreshes with one asyncio lock per
+(user, service): concurrent requests that find a token near expiry wait for
+a single refresh instead of each calling the provider, and the refreshed
+token is persisted once.
+
+Each service registers a refresher (see spotify.py / google.py):
+
+    tokens.register("spotify", refresh_spotify_token)
+
+which receives a snapshot of the current token and returns the updated
+fields ({"access_token": ..., "expires_at": ..., ...}) or None on failure.
+
+A background refresher (start_token_refresher(), run from main.lifespan)
+refreshes tokens TOKEN_REFRESH_MARGIN_SECONDS before they expire, so user
+requests normally never wait on an OAuth round trip; the inline refresh in
+get_valid() is only the fallback. The outcome of every refresh is recorded
+in TokenRefreshStatus.
+"""
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import delete as sa_delete, update
+from sqlmodel import select
+
+from backend.cache import TTLCache
+from backend.database import async_session_maker
+from backend.models import TokenRefreshStatus, UserToken
+
+# Tokens are re-read from the DB after this long, so writes from other workers show up
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+DEFAULT_REFRESH_MARGIN = timedelta(minutes=5)
+
+# Background refresher: refresh this long before expiry (earlier than the inline margin,
+# so it normally gets there first), waking at least every TOKEN_REFRESH_CHECK_SECONDS
+TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "600"))
+TOKEN_REFRESH_CHECK_SECONDS = float(os.getenv("TOKEN_REFRESH_CHECK_SECONDS", "60"))
+# Failed refreshes are retried after 30s, 60s, 120s, ... up to this
+TOKEN_REFRESH_MAX_BACKOFF_SECONDS = float(os.getenv("TOKEN_REFRESH_MAX_BACKOFF_SECONDS", "3600"))
+
+Key = Tuple[int, str]
+Refresher = Callable[[UserToken], Awaitable[Optional[dict]]]
+
+
+@dataclass
+class ServiceConfig:
+    refresh: Refresher
+    margin: timedelta = DEFAULT_REFRESH_MARGIN
+    utc_expiry: bool = False  # Google stores expiry in UTC, Spotify/Monzo in local time
+
+
+def _snapshot(token: UserToken) -> UserToken:
+    """Detached copy, safe to share between requests."""
+    return UserToken(**token.model_dump())
+
+
+class TokenManager:
+    def __init__(self):
+        self._services: Dict[str, ServiceConfig] = {}
+        self._cache = TTLCache(max_entries=1024, ttls={"token": TOKEN_CACHE_TTL_SECONDS})
+        self._locks: Dict[Key, asyncio.Lock] = {}
+        self._failures: Dict[Key, Tuple[int, datetime]] = {}  # consecutive failures, last attempt
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def register(self, service: str, refresh: Refresher, margin: timedelta = DEFAULT_REFRESH_MARGIN,
+                 utc_expiry: bool = False):
+        self._services[service] = ServiceConfig(refresh, margin, utc_expiry)
+
+    def _lock(self, key: Key) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def _load(self, user_id: int, service: str) -> Optional[UserToken]:
+        async with async_session_maker() as session:
+            result = await session.execute(select(UserToken).where(
+                UserToken.user_id == user_id,
+                UserToken.service == service
+            ))
+            token = result.scalars().first()
+        return _snapshot(token) if token else None
+
+    async def get(self, user_id: int, service: str) -> Optional[UserToken]:
+        """Current token for (user, service) from memory, loading it from the DB on a miss."""
+        hit, token = self._cache.get("token", (user_id, service))
+        if hit:
+            return token
+        async with self._lock((user_id, service)):
+            hit, token = self._cache.get("token", (user_id, service))
+            if not hit:
+                token = await self._load(user_id, service)
+                self._cache.set("token", (user_id, service), token)  # None is cached too ("not connected")
+        return token
+
+    def _now(self, service: str) -> datetime:
+        config = self._services.get(service)
+        return datetime.utcnow() if config and config.utc_expiry else datetime.now()
+
+    def needs_refresh(self, token: UserToken, margin: Optional[timedelta] = None) -> bool:
+        if not token.expires_at:
+            return False
+        if margin is None:
+            config = self._services.get(token.service)
+            margin = config.margin if config else DEFAULT_REFRESH_MARGIN
+        return self._now(token.service) >= token.expires_at - margin
+
+    async def get_valid(self, user_id: int, service: str) -> Optional[UserToken]:
+        """Token that isn't about to expire, refreshing it (once, under the lock) if needed."""
+        token = await self.get(user_id, service)
+        if token is None or not token.access_token:
+            return None
+        if not self.needs_refresh(token):
+            return token
+        return await self.refresh(user_id, service)
+
+    async def get_valid_token(self, user_id: int, service: str) -> Optional[str]:
+        token = await self.get_valid(user_id, service)
+        return token.access_token if token else None
+
+    async def refresh(self, user_id: int, service: str, margin: Optional[timedelta] = None,
+                      reload: bool = False) -> Optional[UserToken]:
+        """
+        Refresh a token unless someone else already did while we waited for the lock.
+        Returns the refreshed (or still valid) token, or None if the refresh failed.
+        reload=True reads the token from the DB instead of memory (background refresher).
+        """
+        config = self._services.get(service)
+        async with self._lock((user_id, service)):
+            hit, token = (False, None) if reload else self._cache.get("token", (user_id, service))
+            if not hit:
+                token = await self._load(user_id, service)
+            if token is None or config is None or not token.refresh_token:
+                return None
+            if not self.needs_refresh(token, margin):
+                self._cache.set("token", (user_id, service), token)
+                return token
+
+            self.refreshes += 1
+            error = None
+            try:
+                fields = await config.refresh(token)
+                if not fields:
+                    error = "refresh rejected by provider"
+            except Exception as e:
+                print(f"Error refreshing {service} token for user {user_id}: {e}")
+                fields, error = None, f"{type(e).__name__}: {e}"
+            await self._record_status(user_id, service, error)
+            if error:
+                self.refresh_failures += 1
+                return None
+
+            fields["updated_at"] = datetime.utcnow()
+            async with async_session_maker() as session:
+                await session.execute(update(UserToken).where(UserToken.id == token.id).values(**fields))
+                await session.commit()
+            token = UserToken(**{**token.model_dump(), **fields})
+            self._cache.set("token", (user_id, service), token)
+            return token
+
+    async def _record_status(self, user_id: int, service: str, error: Optional[str]):
+        """Upsert the TokenRefreshStatus row for (user, service)."""
+        now = datetime.utcnow()
+        failures = 0 if error is None else self._failures.get((user_id, service), (0, now))[0] + 1
+        if failures:
+            self._failures[(user_id, service)] = (failures, now)
+        else:
+            self._failures.pop((user_id, service), None)
+        try:
+            async with async_session_maker() as session:
+                result = await session.execute(select(TokenRefreshStatus).where(
+                    TokenRefreshStatus.user_id == user_id,
+                    TokenRefreshStatus.service == service
+                ))
+                status = result.scalars().first() or TokenRefreshStatus(user_id=user_id, service=service)
+                status.last_attempt_at = now
+                status.consecutive_failures = failures
+                if error is None:
+                    status.last_success_at = now
+                    status.last_error = None
+                else:
+                    status.last_error = error[:500]
+                session.add(status)
+                await session.commit()
+        except Exception as e:
+            print(f"Failed to record {service} token refresh status: {e}")
+
+    def _backoff_until(self, key: Key) -> Optional[datetime]:
+        failures, last_attempt = self._failures.get(key, (0, None))
+        if not failures:
+            return None
+        delay = min(30 * 2 ** (failures - 1), TOKEN_REFRESH_MAX_BACKOFF_SECONDS)
+        return last_attempt + timedelta(seconds=delay)
+
+    async def refresh_due(self, margin: timedelta) -> float:
+        """
+        Refresh every token expiring within margin (one DB query for all of them).
+        Returns the number of seconds until the next token becomes due.
+        """
+        async with async_session_maker() as session:
+            result = await session.execute(select(UserToken).where(
+                UserToken.service.in_(list(self._services)),
+                UserToken.refresh_token.is_not(None),
+                UserToken.expires_at.is_not(None)
+            ))
+            due = [(token.user_id, token.service, token.expires_at) for token in result.scalars()]
+
+        next_due = TOKEN_REFRESH_CHECK_SECONDS
+        for user_id, service, expires_at in due:
+            wait = (expires_at - margin - self._now(service)).total_seconds()
+            backoff = self._backoff_until((user_id, service))
+            if backoff:
+                wait = max(wait, (backoff - datetime.utcnow()).total_seconds())
+            if wait <= 0:
+                token = await self.refresh(user_id, service, margin=margin, reload=True)
+                backoff = self._backoff_until((user_id, service))
+                if token is None:
+                    wait = (backoff - datetime.utcnow()).total_seconds() if backoff else TOKEN_REFRESH_CHECK_SECONDS
+                elif token.expires_at:
+                    wait = (token.expires_at - margin - self._now(service)).total_seconds()
+            next_due = min(next_due, wait)
+        return max(next_due, 1.0)
+
+    async def store(self, user_id: int, service: str, **fields) -> UserToken:
+        """Create or update the token for (user, service), e.g. from an OAuth callback."""
+        async with self._lock((user_id, service)):
+            async with async_session_maker() as session:
+                result = await session.execute(select(UserToken).where(
+                    UserToken.user_id == user_id,
+                    UserToken.service == service
+                ))
+                token = result.scalars().first()
+                if token is None:
+                    token = UserToken(user_id=user_id, service=service, **fields)
+                else:
+                    for name, value in fields.items():
+                        setattr(token, name, value)
+                    token.updated_at = datetime.utcnow()
+                session.add(token)
+                await session.commit()
+                await session.refresh(token)
+                token = _snapshot(token)
+            self._cache.set("token", (user_id, service), token)
+            return token
+
+    async def delete(self, user_id: int, service: str):
+        """Remove the token for (user, service) (disconnect)."""
+        async with self._lock((user_id, service)):
+            async with async_session_maker() as session:
+                await session.execute(sa_delete(UserToken).where(
+                    UserToken.user_id == user_id,
+                    UserToken.service == service
+                ))
+                await session.commit()
+            self._cache.set("token", (user_id, service), None)
+            self._failures.pop((user_id, service), None)
+
+    def invalidate(self, user_id: Optional[int] = None, service: Optional[str] = None):
+        """Drop cached tokens (after writes made outside the manager)."""
+        if user_id is None or service is None:
+            self._cache.clear()
+        else:
+            self._cache.invalidate("token", (user_id, service))
+
+    def stats(self) -> dict:
+        return {
+            **self._cache.stats(),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "failing": len(self._failures),
+        }
+
+
+tokens = TokenManager()
+
+_refresher: Optional[asyncio.Task] = None
+
+
+async def _token_refresher():
+    margin = timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS)
+    while True:
+        try:
+            delay = await tokens.refresh_due(margin)
+        except Exception as e:
+            # e.g. tables not created yet on a fresh database
+            print(f"Token refresher failed: {e}")
+            delay = TOKEN_REFRESH_CHECK_SECONDS
+        await asyncio.sleep(delay)
+
+
+def start_token_refresher():
+    """Start the background token refresher (called from main.lifespan)."""
+    global _refresher
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.create_task(_token_refresher())
+
+
+async def stop_token_refresher():
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except asyncio.CancelledError:
+            pass
+        _refresher = None
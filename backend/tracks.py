@@ -0,0 +1,108 @@
+"""
+Compact GPS tracks for map widgets.
+
+Tracks are stored as Google encoded polylines: coordinates rounded to 1e-5 degrees
+(~1 m), delta-encoded between points and packed into printable 5-bit chunks. That's
+~6-8 bytes per point instead of a JSON object per point, and Leaflet/Mapbox/Google
+Maps decode it directly.
+
+simplify() is Douglas-Peucker with the tolerance in metres (points projected onto
+a local equirectangular plane), so each zoom level can get a track that is only as
+detailed as it can show.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+PRECISION = 5
+EARTH_RADIUS_METERS = 6_371_000
+
+# Detail level -> Douglas-Peucker tolerance in metres (0 = every recorded point)
+TOLERANCES_METERS = {
+    "full": 0,
+    "high": 2,
+    "medium": 10,
+    "low": 40,
+}
+
+
+def encode_polyline(coords: np.ndarray, precision: int = PRECISION) -> str:
+    """Encode an (N, 2) array of [lat, lon] as a polyline string."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) == 0:
+        return ""
+    ints = np.round(coords * 10 ** precision).astype(np.int64)
+    deltas = np.diff(ints, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    # Zigzag so small negative numbers stay short
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # Split every value into 5-bit chunks, least significant first; all but the last get 0x20
+    shifts = np.arange(7) * 5  # 35 bits is plenty for degree deltas
+    chunks = (values[:, None] >> shifts) & 0x1F
+    lengths = np.maximum(1, (np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) // 5) + 1)
+    lengths[values == 0] = 1
+    used = np.arange(7) < lengths[:, None]
+    more = np.arange(7) < (lengths[:, None] - 1)
+    chars = chunks + np.where(more, 0x20, 0) + 63
+    return chars[used].astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_polyline(polyline: str, precision: int = PRECISION) -> List[List[float]]:
+    """Decode a polyline string back into [[lat, lon], ...]."""
+    values = []
+    value = shift = 0
+    for char in polyline.encode("ascii"):
+        chunk = char - 63
+        value |= (chunk & 0x1F) << shift
+        shift += 5
+        if chunk < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    coords = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return coords.tolist()
+
+
+def _project(coords: np.ndarray) -> np.ndarray:
+    """[lat, lon] degrees -> local [x, y] metres (equirectangular around the track's mean latitude)."""
+    lat = np.radians(coords[:, 0])
+    lon = np.radians(coords[:, 1])
+    return np.column_stack((lon * np.cos(lat.mean()), lat)) * EARTH_RADIUS_METERS
+
+
+def simplify(coords: np.ndarray, tolerance_meters: float) -> np.ndarray:
+    """Douglas-Peucker: indices of the points to keep so no dropped point is further than the tolerance from the line."""
+    n = len(coords)
+    if tolerance_meters <= 0 or n <= 2:
+        return np.arange(n)
+    points = _project(np.asarray(coords, dtype=np.float64))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        inner = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        furthest = int(np.argmax(distances))
+        if distances[furthest] > tolerance_meters:
+            split = start + 1 + furthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def track_levels(coords: Sequence[Sequence[float]]) -> dict:
+    """Encoded polyline and point count for every detail level in TOLERANCES_METERS."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    levels = {}
+    for detail, tolerance in TOLERANCES_METERS.items():
+        keep = simplify(coords, tolerance)
+        levels[detail] = {"points": len(keep), "polyline": encode_polyline(coords[keep])}
+    return levels
@@ -108,16 +108,52 @@ export const SpotifyWidget: React.FC<SpotifyWidgetProps> = ({ apiUrl }) => {
   };
 
   useEffect(() => {
-    if (apiUrl) {
+    if (!apiUrl) return;
+
+    let interval: ReturnType<typeof setInterval> | null = null;
+    const startPolling = () => {
+      if (interval) return;
       fetchCurrentTrack();
       fetchQueue();
       // Poll every 5 seconds for updates
-      const interval = setInterval(() => {
+      interval = setInterval(() => {
         fetchCurrentTrack();
         fetchQueue();
       }, 5000);
-      return () => clearInterval(interval);
+    };
+
+    if (typeof EventSource === 'undefined') {
+      startPolling();
+      return () => { if (interval) clearInterval(interval); };
     }
+
+    // Live updates pushed by the backend only when something changes
+    const source = new EventSource(`${apiUrl}/api/stream?sources=spotify_track,spotify_queue`, {
+      withCredentials: true
+    });
+    source.addEventListener('spotify_track', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      setSpotifyData(data);
+      if (data.volume_percent !== undefined) {
+        setVolume(data.volume_percent);
+      }
+      setLoading(false);
+    });
+    source.addEventListener('spotify_queue', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      setQueue(data.queue || []);
+    });
+    source.onerror = () => {
+      // Stream unavailable before it ever opened - fall back to polling
+      if (source.readyState === EventSource.CLOSED) {
+        startPolling();
+      }
+    };
+
+    return () => {
+      source.close();
+      if (interval) clearInterval(interval);
+    };
   }, [apiUrl]);
 
   const handlePlayPause = async () => {